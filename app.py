@@ -1,6 +1,14 @@
 from flask import Flask, render_template, request, jsonify, g
-from datetime import datetime
-from utilities.db_access import get_db_connection, pool, get_channel_name_from_id
+from utilities.db_access import get_db_connection, run_read_query, release_read_connection, pool, get_pool_stats, get_catalog_version, load_content_titles, load_facet_values, load_search_rows
+from utilities.catalog_watcher import CatalogWatcher
+from utilities.facet_index import FacetIndex
+from utilities.prepared_statements import PreparedStatements
+from utilities.search_cache import SearchCache
+from utilities.title_index import TitleIndex
+from utilities.search_query import (
+    RANGE_FILTERS, SORT_KEYS, build_count_query, build_facet_counts_query, build_search_query, collect_facet_counts,
+    decode_cursor, next_cursor, parse_range_filters, split_total,
+)
 from contextlib import closing
 import os
 import sqlite3
@@ -22,316 +30,294 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 DATABASE = 'soccer_content.db'
 
+# 検索結果の総件数の取得方法 (exact / estimate / separate)
+# exact は最初のページで行と総件数を1回の往復で取得して総件数をキャッシュし、2ページ目以降は
+# キャッシュした総件数を使ってページだけを並び替えのインデックスから上位N件読む。
+# separate は最初のページから総件数を別のクエリで数える
+SEARCH_TOTAL_MODE = os.getenv('SEARCH_TOTAL_MODE', 'exact')
 
-def convert_to_embed_url(video_url):
-    """YouTubeの通常リンクからVIDEO_IDを抽出し、埋め込みリンクを生成する"""
-    #logger.info(f"Converting video URL: {video_url}")
-    if "watch?v=" in video_url:
-        video_id = video_url.split("watch?v=")[-1]
-        return f"https://www.youtube.com/embed/{video_id}"
-    return video_url  # 他のリンク形式の場合そのまま返す
-
+# 検索クエリの形ごとに接続単位で PREPARE して再利用する（PgBouncer の transaction モードなどでは 0 にする）
+prepared_statements = PreparedStatements() if os.getenv('PREPARED_STATEMENTS', '1') == '1' else None
 
-def convert_activities(activities):
-    """アクティビティリストのデータを変換する"""
-    logger.info("Converting activities")
-    result = []
 
-    column_names = [
-        "id", "title", "upload_date", "video_url", "view_count", 
-        "like_count", "duration", "channel_category"
-    ]  # カラム名を明示的に定義
-
-    for activity in activities:
-        # zip() を使ってタプルを辞書に変換
-        activity_dict = dict(zip(column_names, activity))
-
-        dt = activity_dict["upload_date"].rstrip("Z")
-        try:
-            # 日本語形式（例: "2023年11月22日11時00分"）の場合
-            date_obj = datetime.strptime(dt, "%Y-%m-%dT%H:%M:%S")
-        except ValueError:
-            try:
-                date_obj = datetime.strptime(dt, "%Y年%m月%d日%H時%M分")
-            except ValueError:
-                logger.error(f"Unsupported date format: {dt}")
-                continue
-
-        # 必要に応じてフォーマットを変換して保存
-        activity_dict["upload_date"] = date_obj.strftime("%Y年%m月%d日%H時%M分")
-        activity_dict["video_url"] = convert_to_embed_url(activity_dict["video_url"])
-        activity_dict["channel_category"] = get_channel_name_from_id(activity_dict["channel_category"])
+def execute_search(c, query, params):
+    """検索用のクエリを実行する（プリペアドステートメントが有効なら EXECUTE で実行）"""
+    if prepared_statements is None:
+        c.execute(query, params)
+    else:
+        prepared_statements.execute(c, query, params)
 
-        result.append(activity_dict)
+# タイトル検索の方法 (memory: プロセス内のバイグラムインデックス / ilike: DB の pg_trgm インデックスで部分一致)
+TITLE_SEARCH_BACKEND = os.getenv('TITLE_SEARCH_BACKEND', 'memory')
 
-    return result
+# 取り込み（main.py）が上げるカタログバージョンを確認する間隔（秒）
+catalog_watcher = CatalogWatcher(get_catalog_version, float(os.getenv('CATALOG_POLL_SECONDS', 30)))
 
+title_index = None  # TitleIndex（読み込みに失敗した場合は None で ILIKE 検索になる）
 
-def build_query_with_filters(base_query, filters, params):
-    """フィルタに基づいてクエリを構築する補助関数"""
-    if filters.get('type_filter'):
-        base_query += " AND category_title = %s"
-        params.append(filters['type_filter'])
+# 検索ワードなしの検索をプロセス内で処理するファセットインデックス（0 で無効）
+USE_FACET_INDEX = os.getenv('FACET_INDEX', '1') != '0'
+facet_index = None
 
-    if filters.get('players_filter'):
-        base_query += " AND players = %s"
-        params.append(filters['players_filter'])
+# フィルタの選択肢（/facets などで返す）のスナップショット
+facet_snapshot = None
+EMPTY_FACETS = {"category_title": [], "players": [], "levels": [], "channels": []}
 
-    if filters.get('level_filter'):
-        base_query += " AND level = %s"
-        params.append(filters['level_filter'])
+# 変換済みの検索結果のキャッシュ（カタログバージョンが変わったら破棄）
+search_cache = SearchCache(int(os.getenv('SEARCH_CACHE_SIZE', 1024)), float(os.getenv('SEARCH_CACHE_TTL', 300)))
 
-    if filters.get('channel_filter'):
-        base_query += " AND channel_brand_category = %s"
-        params.append(filters['channel_filter'])
 
-    return base_query, params
+def refresh_title_index(version):
+    """カタログが更新されたらタイトル検索インデックスを作り直す"""
+    global title_index
+    if TITLE_SEARCH_BACKEND != 'memory':
+        return
+    try:
+        title_index = TitleIndex.build(load_content_titles())
+    except psycopg2.Error as e:
+        logger.error("Error while building title index: %s", e)
 
 
-def execute_query(conn, query, params):
-    """クエリを実行し、結果を返す"""
-    logger.info(f"Executing query: {query} with params: {params}")    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def refresh_facet_index(version):
+    """カタログが更新されたらファセットインデックスに差分を反映する"""
+    global facet_index
+    if not USE_FACET_INDEX:
+        return
     try:
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-        #print("results", results)
-        return results
-    except Exception as e:
-        logger.error(f"Error executing query: {e}")
-        return []
-
-
-# def safe_query(conn, query, params):
-#     """安全にクエリを実行する関数"""
-#     logger.info(f"Executing safe query: {query} with params: {params}")
-#     query = f"SELECT ID FROM contents WHERE ID IN ('ewMGrhiWc1E', 'vY8B71_TVLw', '6sFICjN9bPQ', 'hUBAMSuydJI', 'y_ZXOJJFyuA', 'EnZ95vi9RU8', 'TIu4PNw_PTQ', 'XPPl5NDFdMc', 'sYVfBvdc6Xo', 'HKcB-ZrL52Q');"
-#     try:
-#         #result = conn.execute(query, params)
-#         result = conn.execute(query)
-#         t = conn.fetchall()
-#         print("RES", result, len(t))
-#         if result is None:
-#             logger.warning("Query returned no results.")
-#             return None
-# 
-#         row = result.fetchone()
-#         print("row", row)
-#         if row is None:
-#             logger.warning("No row found.")
-#             return None
-# 
-#         return row[0]
-# 
-#     except Exception as e:
-#         logger.error(f"Error executing query: {e}")
-#         return None
-
-def get_total_data_by_id(conn, q, ids):
-    """IDリストに基づいて総データ数を取得"""
-
-    conn = get_db_connection()
+        rows = load_search_rows()
+    except psycopg2.Error as e:
+        logger.error("Error while loading facet index rows: %s", e)
+        return
+    if facet_index is None:
+        facet_index = FacetIndex.build(rows)
+    else:
+        facet_index.update(rows)
 
-    if not ids:
-        return 0
 
-    # プレースホルダを作成
-    placeholders = ', '.join(['%s'] * len(ids))
+def refresh_facets(version):
+    """カタログが更新されたらフィルタの選択肢を読み直す"""
+    global facet_snapshot
+    try:
+        facet_snapshot = load_facet_values()
+    except psycopg2.Error as e:
+        logger.error("Error while loading facet values: %s", e)
 
-    # qが指定されている場合、titleのLIKE句のパラメータを作成
-    q_like = f"%{q}%" if q else None
 
-    # クエリの作成
-    query = f'''
-        SELECT count(*) FROM contents
-        WHERE ID IN ({placeholders})
-    '''
+catalog_watcher.subscribe(refresh_title_index)
+catalog_watcher.subscribe(refresh_facets)
+catalog_watcher.subscribe(refresh_facet_index)
+# キャッシュはインデックス・選択肢をすべて読み直した後に破棄する（読み込み中の結果を新しいバージョンで保存しない）
+catalog_watcher.subscribe(search_cache.invalidate)
+catalog_watcher.check(force=True)  # ワーカー起動時にインデックス・選択肢を読み込む
 
-    # パラメータをidsとして設定
-    params = ids
 
-    # qが指定されている場合、LIKE句を追加
-    if q:
-        query += " AND title LIKE %s"
-        params.append(q_like)
+def convert_activities(activities):
+    """検索結果の行を辞書に変換する（日付・埋め込みURLは取り込み時に変換済み）"""
+    column_names = [
+        "id", "title", "upload_date", "video_url", "view_count", 
+        "like_count", "duration", "channel_category"
+    ]  # カラム名を明示的に定義（channel_category は検索クエリで結合済みのチャンネル名）
+
+    # zip() を使ってタプルを辞書に変換（並び替え用の published_at・popularity は含めない）
+    return [dict(zip(column_names, activity)) for activity in activities]
+
+
+def total_cache_key(query, filters):
+    """総件数のキャッシュのキー（並び替え・ページに関係なく検索条件だけで決まる）"""
+    return ('total', query, *filters.values())
+
+
+def count_total(c, query, filters, ids):
+    """条件に一致する総件数（ページをまたいで使い回すので検索結果のキャッシュに保存する）"""
+    version = catalog_watcher.version
+    total = search_cache.get(total_cache_key(query, filters))
+    if total is None:
+        count_query, count_params = build_count_query(query, filters, ids)
+        execute_search(c, count_query, count_params)
+        total = c.fetchone()[0]
+        search_cache.set(total_cache_key(query, filters), total, version)
+    return total
+
+
+def find_activities(query, filters, sort, limit, offset, position):
+    """検索条件に一致する1ページ分の結果を作成する（DB エラーは呼び出し元で処理）"""
+    # 検索ワードはタイトル検索インデックスで候補 ID に変換してから DB で絞り込む
+    ids = search_title_ids(query)
+    page = None
+    if not query and facet_index is not None:
+        # フィルタだけの検索はビットマップの AND と事前に並べた順序で DB を使わずに処理
+        page = facet_index.search(filters, sort, limit, offset, position)
+
+    if page is not None:
+        activities, total = page
+    elif ids is not None and not ids:
+        activities, total = [], 0  # 一致するタイトルがなければ DB に問い合わせない
+    else:
+        version = catalog_watcher.version
+        total_mode = SEARCH_TOTAL_MODE
+        if total_mode == 'exact' and search_cache.get(total_cache_key(query, filters)) is not None:
+            total_mode = 'separate'  # 総件数が分かっていればページだけをインデックスから読む
+
+        def run(conn):
+            with closing(conn.cursor()) as c:  # ✅ カーソルのみ `closing` を使用
+                # フィルタ・検索ワード・並び替えを contents と category の JOIN 1本にまとめる
+                # （総件数が必要な場合はページの行と総件数を1回の往復で取得する）
+                page_query, page_params = build_search_query(query, filters, sort, limit, offset,
+                                                             total_mode, position, ids)
+                execute_search(c, page_query, page_params)
+                if total_mode == 'separate':
+                    activities = c.fetchall()
+                    total = count_total(c, query, filters, ids)
+                else:
+                    activities, total = split_total(c.fetchall())
+                    if total is not None and position is not None:
+                        total += offset  # カーソル以降の件数に表示済みの件数を足す
+                    elif total is not None and total_mode == 'exact':
+                        search_cache.set(total_cache_key(query, filters), total, version)
+
+                if total is None:
+                    total = 0
+                    if offset > 0:  # 最終ページより後ろを指定された場合のみ件数を別途数える
+                        count_query, count_params = build_count_query(query, filters, ids)
+                        execute_search(c, count_query, count_params)
+                        total = c.fetchone()[0]
+                return activities, total
+
+        # レプリカがクエリの途中で落ちた場合はプライマリで1回だけやり直す
+        activities, total = run_read_query(run)
+
+    return {
+        "activities": convert_activities(activities),
+        "total": total,
+        "current_display_count": len(activities) + offset,
+        "next_cursor": next_cursor(activities, sort, limit)
+    }
 
-    cursor = conn.cursor()  # カーソルを取得
 
-    # クエリを実行
-    cursor.execute(query, params)
+def read_search_filters():
+    """リクエストから検索ワードとフィルタを取得する（範囲フィルタが不正な場合は ValueError）"""
+    query = request.args.get('q', '')
+    filters = {
+        'type_filter': request.args.get('type', ''),
+        'players_filter': request.args.get('players', ''),
+        'level_filter': request.args.get('level', ''),
+        'channel_filter': request.args.get('channel', '')
+    }
+    # 動画時間（秒）・アップロード日の範囲
+    filters.update(dict.fromkeys(RANGE_FILTERS))
+    filters.update(parse_range_filters(request.args))
+    return unicodedata.normalize('NFKC', query.strip()), filters
 
-    # 結果を取得
-    result = cursor.fetchone()  # 1行を取得
 
-    if result:
-        count = result[0]  # count(*)の値
-    else:
-        count = 0
-
-    cursor.close()  # カーソルを閉じる
-
-    return count
-
-
-# def get_total_data_by_id(conn, q, ids):
-#     """IDリストに基づいて総データ数を取得"""
-#     #print("HOIHIOHIOHOIHI", q, ids)
-#
-#     if not ids:
-#         return 0
-#
-#     placeholders = ', '.join(['%s'] * len(ids))
-#     q_like = f"%{q}%" if q else None
-#
-#     query = f'''
-#         SELECT count(*) FROM contents
-#         WHERE ID IN ({placeholders})
-#     '''
-#     params = ids
-#     if q:
-#         query += " AND title LIKE %s"
-#         params.append(q_like)
-#
-#     print("THISIS", query, params)
-#
-#     conn = get_db_connection()
-#     cursor = conn.cursor()
-#
-#     res = cursor.execute(query, params)
-#     print("WWWW", res)
-#
-#     return res
-
-    #result = conn.execute(query, params).fetchone()
-    # if result is not None:
-    #     return result[0]
-    # else:
-    #     return 0  # 該当するレコードがない場合、0を返す
-
-    #return conn.execute(query, params).fetchone()[0]
-    # count = safe_query(conn, query, params)
-    # #print(count)
-    # if count is None:
-    #     logger.info("No data found, count set to 0")
-    #     count = 0
-
-
-def get_data_by_id(conn, q, ids, sort, offset, limit=None):
-    """IDリストに基づいてデータを取得"""
-    if not ids:
-        return []
-
-    # PostgreSQL では %s を使う
-    placeholders = ', '.join(['%s'] * len(ids))
-    q_like = f"%{q}%" if q else None
-
-    # クエリ構築
-    query = f'''
-        SELECT * FROM contents
-        WHERE ID IN ({placeholders})
-    '''
-    params = ids
-
-    if q:
-        query += " AND title LIKE %s"
-        params.append(q_like)
-
-    query += f" ORDER BY {sort} DESC LIMIT %s OFFSET %s"
-    params.extend([limit, offset])
-
-    # クエリ実行
-    return execute_query(conn, query, params)
-
-
-
-def multi_search_total(conn, q, filters):
-    """複数のフィルタ条件に基づいて総データ数を取得"""
-    base_query = "SELECT * FROM category WHERE 1=1"
-    params = []
-    base_query, params = build_query_with_filters(base_query, filters, params)
-
-    rows = execute_query(conn, base_query, params)
-    #ids = [row["ID"] for row in rows]
-    #print("rows", rows)
-    ids = [row[0] for row in rows]
-    return get_total_data_by_id(conn, q, ids)
-
-
-def multi_search(conn, q, filters, sort, offset, limit):
-    """複数のフィルタ条件に基づいてデータを取得"""
-    base_query = "SELECT * FROM category WHERE 1=1"
-    params = []
-    base_query, params = build_query_with_filters(base_query, filters, params)
-    #print("HIHI", base_query, params)
-
-    rows = execute_query(conn, base_query, params)
-    #ids = [row["ID"] for row in rows]
-    ids = [row[0] for row in rows]
-    return get_data_by_id(conn, q, ids, sort, offset, limit)
+def search_title_ids(query):
+    """検索ワードをタイトル検索インデックスで候補 ID に変換（インデックスがなければ None）"""
+    if not query:
+        return None
+    index = title_index
+    if index is None:
+        return None
+    return index.search(query)
 
 
 @app.route('/search')
 def search_activities():
     
-    query = request.args.get('q', '')
-    type_filter = request.args.get('type', '')
-    players_filter = request.args.get('players', '')
-    level_filter = request.args.get('level', '')
-    channel_filter = request.args.get('channel', '')
+    try:
+        query, filters = read_search_filters()
+    except ValueError as e:
+        logger.warning("Invalid search filter: %s", e)
+        return jsonify({"error": "Invalid filter"}), 400
     sort = request.args.get('sort', 'upload_date')
     limit = int(request.args.get('limit', 10))
     offset = int(request.args.get('offset', 0))
+    cursor = request.args.get('cursor', '')
 
-    filters = {
-        'type_filter': type_filter,
-        'players_filter': players_filter,
-        'level_filter': level_filter,
-        'channel_filter': channel_filter
-    }
+    if limit <= 0:
+        logger.warning("Invalid limit: %s", limit)
+        return jsonify({"error": "Invalid limit"}), 400
 
-    conn = get_db_connection()
-    with closing(conn.cursor()) as c:  # ✅ カーソルのみ `closing` を使用
+    if sort not in SORT_KEYS:  # ORDER BY に埋め込むので登録済みのキー以外は受け付けない
+        logger.warning("Invalid sort key: %s", sort)
+        return jsonify({"error": "Invalid sort"}), 400
+
+    try:
+        # カーソルがあれば OFFSET を読み飛ばさずに前ページの続きから取得する
+        position = decode_cursor(cursor, sort) if cursor else None
+    except ValueError as e:
+        logger.warning("Invalid search cursor: %s", e)
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    # 同じ条件の検索は取り込みでカタログが変わるまで変換済みの結果を使い回す
+    version = catalog_watcher.check()
+    cache_key = (query, *filters.values(), sort, limit, offset, cursor)
+    result = search_cache.get(cache_key)
+    if result is None:
         try:
-            if query:
-                if not any([type_filter, players_filter, level_filter, channel_filter]):
-                    query = unicodedata.normalize('NFKC', query.strip())
+            result = find_activities(query, filters, sort, limit, offset, position)
+        except psycopg2.Error as e:
+            logger.error("Error while executing search query: %s", e)
+            return jsonify({"error": "Database error"}), 500  # HTTP 500 を返す
+        search_cache.set(cache_key, result, version)
 
-                    c.execute('''
-                        SELECT count(*) FROM contents
-                        WHERE title ILIKE %s
-                    ''', ('%' + query + '%',))  # ✅ `?` → `%s` に修正 (PostgreSQL 用)
+    return jsonify(result)
 
-                    total = c.fetchone()[0]
 
-                    c.execute(f'''
-                        SELECT * FROM contents
-                        WHERE title ILIKE %s
-                        ORDER BY {sort} DESC
-                        LIMIT %s OFFSET %s
-                    ''', ('%' + query + '%', limit, offset))
+def count_facets(query, filters):
+    """現在の検索条件でフィルタの値ごとの一致件数を数える（DB エラーは呼び出し元で処理）"""
+    if not query and facet_index is not None:
+        counts = facet_index.facet_counts(filters)
+        if counts is not None:
+            return counts
+
+    ids = search_title_ids(query)
+    if ids is not None and not ids:
+        return collect_facet_counts([])
+
+    def run(conn):
+        with closing(conn.cursor()) as c:
+            facet_query, facet_params = build_facet_counts_query(query, filters, ids)
+            execute_search(c, facet_query, facet_params)
+            return collect_facet_counts(c.fetchall())
+
+    return run_read_query(run)
 
-                    activities = c.fetchall()
-                else:
-                    total = multi_search_total(c, query, filters)
-                    activities = multi_search(c, query, filters, sort, offset, limit)
-            else:
-                total = multi_search_total(c, query, filters)
-                activities = multi_search(c, query, filters, sort, offset, limit)
 
+# 選択中の条件で各フィルタの値を選んだ場合の件数を返す（0件になる選択肢を事前に分かるようにする）
+@app.route('/search/facets')
+def search_facets():
+    try:
+        query, filters = read_search_filters()
+    except ValueError as e:
+        logger.warning("Invalid search filter: %s", e)
+        return jsonify({"error": "Invalid filter"}), 400
+
+    version = catalog_watcher.check()
+    cache_key = ('facets', query, *filters.values())
+    result = search_cache.get(cache_key)
+    if result is None:
+        try:
+            result = count_facets(query, filters)
         except psycopg2.Error as e:
-            logger.error("Error while executing search query: %s", e)
-            return jsonify({"error": "Database error"}), 500  # HTTP 500 を返す
+            logger.error("Error while counting facets: %s", e)
+            return jsonify({"error": "Database error"}), 500
+        search_cache.set(cache_key, result, version)
 
-    current_display_count = len(activities) + offset
+    return jsonify(result)
 
-    #conn.close()
 
-    return jsonify({
-        "activities": convert_activities(activities),
-        "total": total,
-        "current_display_count": current_display_count
-    })
+@app.route('/stats/search_cache')
+def search_cache_stats():
+    return jsonify(search_cache.stats())
+
+
+@app.route('/stats/prepared_statements')
+def prepared_statements_stats():
+    return jsonify(prepared_statements.stats() if prepared_statements is not None else {})
+
+
+@app.route('/stats/db_pool')
+def db_pool_stats():
+    return jsonify(get_pool_stats())
 
 
 def save_feedback_to_db(feedback):
@@ -346,25 +332,27 @@ def save_feedback_to_db(feedback):
             )
             conn.commit()
     except Exception as e:
+        conn.rollback()
         logger.error(f"Error saving feedback: {e}")
-    finally:
-        conn.close()
+
+
+def get_facets():
+    """フィルタの選択肢のスナップショットを返す（未読み込みならここで読み込む）"""
+    catalog_watcher.check()
+    if facet_snapshot is None:
+        refresh_facets(catalog_watcher.version)
+    return facet_snapshot or EMPTY_FACETS
+
+
+# 画面表示時に必要なフィルタの選択肢を1回のリクエストで返す
+@app.route("/facets")
+def facets_api():
+    return jsonify(get_facets())
 
 
 # DBからユニークな値を取得する関数
 def get_unique_values(column_name):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    query = f"""
-        SELECT DISTINCT {column_name} 
-        FROM category 
-        WHERE {column_name} IS NOT NULL AND {column_name} != ''
-        ORDER BY {column_name} ASC
-    """
-    cursor.execute(query)
-    values = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return values
+    return get_facets()[column_name]
 
 
 # APIエンドポイント
@@ -376,16 +364,7 @@ def get_unique_values_api(column):
 
 
 def get_levels():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT DISTINCT level FROM category")
-        levels = [{"level": row[0]} for row in cursor.fetchall()]
-    except Exception as e:
-        logger.error(f"Error loading level option: {e}")
-    finally:
-        conn.close()
-    return levels
+    return get_facets()["levels"]
 
 
 # APIエンドポイント（JSONでチャネル一覧を返す）
@@ -395,17 +374,7 @@ def get_levels_api():
 
 
 def get_channels():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT id, cname, clink FROM cid")
-        channels = [{"id": row[0], "channel_name": row[1], "channel_link": row[2]} for row in cursor.fetchall()]
-    except Exception as e:
-        logger.error(f"Error loading channel option: {e}")
-        channels = []
-    finally:
-        conn.close()
-    return channels
+    return get_facets()["channels"]
 
 
 # APIエンドポイント（JSONでチャネル一覧を返す）
@@ -436,12 +405,13 @@ def submit_feedback():
 
 @app.teardown_appcontext
 def close_db(error):
-    """リクエストが終わったら接続を閉じる"""
+    """リクエストが終わったら接続をプールに返却する（リクエスト単位の貸し出し）"""
     db = g.pop('db', None)
     if db is not None:
         #db.close()
         pool.putconn(db)
-        logger.info("Closing database connection...")
+        logger.info("Database connection returned to pool")
+    release_read_connection()
 
 
 @app.route('/')
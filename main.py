@@ -1,7 +1,8 @@
-from utilities.get_videos import get_youtube_video_data
-from utilities.get_channel_id import get_channel_id, get_channel_details
-from utilities.db_access import create_cid_table, get_db_connection, insert_cid_data, create_contents_table, insert_contents_data, create_category_table, search_content_table, insert_category_data, create_feedback_table
-from utilities.update_category_db import update_category
+from utilities.get_videos import iter_youtube_video_data, iter_uploads_video_data
+from utilities.get_channel_id import get_channel_id, get_channels_details
+from utilities.ingest_pipeline import classify, rechunk, stream_concurrently, write_streams
+from utilities import http_client
+from utilities.db_access import create_cid_table, get_db_connection, insert_cid_data, create_contents_table, migrate_contents_typed_columns, create_title_search_index, create_range_filter_indexes, create_sort_indexes, create_category_table, insert_chunk_data, create_feedback_table, create_catalog_version_table, bump_catalog_version, update_popularity_scores, create_channel_watermarks_table, get_channel_watermark, update_channel_watermark
 from flask import Flask
 import os
 import sys
@@ -18,6 +19,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 並列に動画を取得するチャンネル数
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', 4))
+# 1回に書き込む動画数と、書き込み待ちにしておけるチャンク数（メモリ使用量の上限になる）
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 500))
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', 4))
+
 if __name__ == '__main__':
     with app.app_context():
 
@@ -33,6 +40,11 @@ if __name__ == '__main__':
     
         get_db_connection()
         api_key = os.getenv('API_KEY')
+        # API のレスポンスを ETag 付きでディスクに保存し、変更のないページは 304 で済ませる
+        # （API_CACHE_MODE=replay でネットワークを使わずに保存済みのレスポンスだけで実行できる）
+        http_client.configure_cache(os.getenv('API_CACHE_DIR', '.api_cache'),
+                                    int(os.getenv('API_CACHE_MAX_MB', 200)) * 1024 * 1024,
+                                    os.getenv('API_CACHE_MODE', 'on'))
     
         if not api_key:
             logger.error("API key is missing. Please set it in the .env file.")
@@ -55,32 +67,72 @@ if __name__ == '__main__':
         channels = channel_id.split(",")
         channel_links = channel_link.split(",")
         create_cid_table()
+        create_channel_watermarks_table()
+        # --full を指定した場合はウォーターマークを無視して全動画を取得し直す
+        full_crawl = '--full' in sys.argv[1:]
+        # 動画一覧の取得方法（uploads: アップロード動画の再生リストを1ページ1ユニットでたどる /
+        # search: search API で1ページ100ユニット）
+        iter_video_data = iter_youtube_video_data if os.getenv('VIDEO_CRAWLER', 'uploads') == 'search' else iter_uploads_video_data
     
+        # チャンネル名は channels API で50件ずつまとめて取得する（アップロード動画の再生リストIDも同時に取得）
+        channel_names = get_channels_details(channels, api_key)
+        missing = [cid for cid in channels if channel_names[cid] == "N/A"]
+        if missing:
+            logger.error("Failed to retrieve channel name: %s", missing)
+            sys.exit(1)
+
+        ########################################################
+        ## contents / category setup
+        ########################################################
         for c_num, cid in enumerate(channels, start=1):
-            channel_name = get_channel_details(cid, api_key)
-            #print(c_num, cid, channel_name, channel_links[c_num-1])
-            if channel_name == "N/A":
-                logger.error("Failed to retrieve channel name.")
-                sys.exit(1)
-            ########################################################
-            ## contents setup
-            ########################################################
-            insert_cid_data(cid, channel_name, channel_links[c_num-1])
-            create_contents_table()
-            video_data = get_youtube_video_data(cid, api_key)
-            # for data in video_data:
-            #     print(data)
-            #     print(data['id'], data['title'], data['upload_date'], data['url'],
-            #               data['view_count'], data['like_count'], data['duration'], c_num)
-            insert_contents_data(video_data, c_num)
-            #########################################################
-            ## category setup
-            #########################################################
-            create_category_table()
-            contents = search_content_table() # search table parameter not work
-            contents_data = update_category(contents)
-            insert_category_data(contents_data, c_num)
+            insert_cid_data(cid, channel_names[cid], channel_links[c_num-1])
+        create_contents_table()
+        migrate_contents_typed_columns()
+        create_title_search_index()
+        create_range_filter_indexes()
+        create_sort_indexes()
+        create_category_table()
+
+        # 前回取り込んだ最新の公開日時より新しい動画だけを取得する
+        watermarks = {cid: None if full_crawl else get_channel_watermark(cid) for cid in channels}
+
+        def ingest_stages(cid, published_after):
+            """1チャンネル分の 取得 → 詳細の付与 → 書き込み単位へのまとめ直し → 分類 をジェネレータでつなぐ"""
+            pages = iter_video_data(cid, api_key, published_after)
+            return classify(rechunk(pages, INGEST_BATCH_SIZE))
+
+        def write_chunk(key, video_data, contents_data):
+            """1チャンク分の動画とカテゴリを1つのトランザクションで書き込む（失敗した場合は False）"""
+            c_num, _ = key
+            return insert_chunk_data(video_data, contents_data, c_num) is not None
+
+        # 動画の取得はチャンネルごとに並列に行い（API の呼び出し回数は全体で制限）、
+        # DB への書き込みはチャンク単位でこのスレッドだけで行う。書き込みが追いつかない場合は取得側が待つ
+        # 書き込みに失敗したチャンネルは cancelled に入れて取得もやめる
+        tasks = [((c_num, cid), (cid, watermarks[cid])) for c_num, cid in enumerate(channels, start=1)]
+        cancelled = set()
+        failed = write_streams(
+            stream_concurrently(tasks, ingest_stages, INGEST_WORKERS, INGEST_QUEUE_SIZE, cancelled),
+            write_chunk,
+            {key: watermarks[cid] for key, (cid, _) in tasks},
+            lambda key, latest: update_channel_watermark(key[1], latest),
+            cancelled.add,
+        )
+        if failed:
+            logger.error("Failed to ingest channels (will retry from the same watermark): %s",
+                         [cid for _, cid in failed])
+
+        # API のエンドポイントごとの応答時間・再試行回数
+        logger.info("API request stats: %s", http_client.stats())
 
         create_feedback_table()
-        logger.info("feedback table created. All processes finished successfully")
+        logger.info("feedback table created.")
+
+        # 人気スコアの新しさの重みを現在の日時で計算し直す
+        update_popularity_scores()
+
+        # Web 側のタイトル検索インデックスなどに取り込み完了を通知
+        create_catalog_version_table()
+        bump_catalog_version()
+        logger.info("catalog version bumped. All processes finished successfully")
 
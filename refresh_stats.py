@@ -0,0 +1,70 @@
+from utilities.get_videos import fetch_video_details
+from utilities.db_access import iter_content_chunks, update_content_stats, create_catalog_version_table, bump_catalog_version
+from utilities.bulk_write import stats_rows
+from utilities import http_client
+from flask import Flask
+import os
+import sys
+import requests
+from dotenv import load_dotenv
+import logging
+
+app = Flask(__name__)
+
+# ロガーの設定
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+# videos API に一度に渡せる動画IDの上限
+CHUNK_SIZE = 50
+
+
+def refresh_stats(api_key: str) -> int:
+    """登録済みの全動画の再生回数・いいね数を取得し直し、変わったものだけ更新する（更新した行数を返す）"""
+    checked = updated = 0
+    rows = []
+    for chunk in iter_content_chunks(CHUNK_SIZE):
+        published_at = dict(chunk)
+        try:
+            details = fetch_video_details(list(published_at), api_key)
+        except requests.exceptions.RequestException as e:
+            # 取得できなかった動画は更新せず、次回の実行で取得し直す
+            logger.error("Failed to fetch statistics for %d videos: %s", len(chunk), e)
+            continue
+        rows.extend(stats_rows(published_at, details))
+        checked += len(chunk)
+
+        # API の結果はある程度まとめてから1回の UPDATE で書き込む
+        if len(rows) >= 1000:
+            updated += update_content_stats(rows)
+            rows = []
+
+    if rows:
+        updated += update_content_stats(rows)
+    logger.info("Statistics refreshed: %d checked, %d updated.", checked, updated)
+    return updated
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        load_dotenv("./utilities/.env")
+        api_key = os.getenv('API_KEY')
+        # API のレスポンスを ETag 付きでディスクに保存し、変更のないページは 304 で済ませる
+        # （API_CACHE_MODE=replay でネットワークを使わずに保存済みのレスポンスだけで実行できる）
+        http_client.configure_cache(os.getenv('API_CACHE_DIR', '.api_cache'),
+                                    int(os.getenv('API_CACHE_MAX_MB', 200)) * 1024 * 1024,
+                                    os.getenv('API_CACHE_MODE', 'on'))
+
+        if not api_key:
+            logger.error("API key is missing. Please set it in the .env file.")
+            sys.exit(1)
+
+        if refresh_stats(api_key):
+            # Web 側のインデックス・キャッシュに再生回数の変更を通知
+            create_catalog_version_table()
+            bump_catalog_version()
+            logger.info("catalog version bumped.")
@@ -4,101 +4,129 @@ document.addEventListener('DOMContentLoaded', () => {
     updatePaginationButtons(); // 初期化時にボタンを更新
     initTabSwitching(); // タブ切り替え処理の初期化
     setupSearchHandler(); // 検索の初期設定
-    populateChannelSelect(); // チャネル選択肢を設定
-    populateLevelSelect();
-    populateSelect("type-input", "category_title");  // カテゴリの選択肢を設定
-    populateSelect("players-input", "players");  // プレイヤー数の選択肢を設定
+    loadFacets(); // 選択肢をまとめて取得して設定
 });
 
-// ユニークな選択肢を取得・設定する関数
-function populateSelect(selectId, columnName) {
-    fetch(`/get_unique_values/${columnName}`)
+// フィルタの選択肢を1回のリクエストで取得し、各セレクトに設定する
+function loadFacets() {
+    fetch("/facets")
         .then(response => response.json())
-        .then(data => {
-            const select = document.getElementById(selectId);
-            select.innerHTML = `<option value="">${selectId === "type-input" ? "カテゴリ" : "プレイヤー数"}を選択</option>`; // 初期値をセット
-
-            const n_vs_n = [];
-            const n_people = [];
-            const others = [];
-
-            data.forEach(value => {
-                let match;
-                if ((match = value.match(/^(\d+)対(\d+)$/))) {
-                    // "n対n" の形式を解析
-                    const num1 = parseInt(match[1], 10);
-                    const num2 = parseInt(match[2], 10);
-                    n_vs_n.push({ value, num1, num2 });
-                } else if ((match = value.match(/^(\d+)人$/))) {
-                    // "n人" の形式を解析
-                    const num = parseInt(match[1], 10);
-                    n_people.push({ value, num });
-                } else {
-                    // その他の値（例: "人数指定なし" など）
-                    others.push(value);
-                }
-            });
-
-            // 数値順にソート
-            n_vs_n.sort((a, b) => a.num1 - b.num1 || a.num2 - b.num2);
-            n_people.sort((a, b) => a.num - b.num);
-            others.sort(); // それ以外は通常の文字列ソート
-
-            // 並び替えたリストを `<select>` に追加
-            [...n_vs_n.map(obj => obj.value), ...n_people.map(obj => obj.value), ...others].forEach(value => {
-                const option = document.createElement("option");
-                option.value = value;
-                option.textContent = value;
-                select.appendChild(option);
+        .then(facets => {
+            populateChannelSelect(facets.channels); // チャネル選択肢を設定
+            populateLevelSelect(facets.levels);
+            populateSelect("type-input", facets.category_title);  // カテゴリの選択肢を設定
+            populateSelect("players-input", facets.players);  // プレイヤー数の選択肢を設定
+
+            // 条件が変わるたびに各選択肢の件数を更新する
+            ["search-input", "type-input", "players-input", "level-input", "channel-input"].forEach(id => {
+                document.getElementById(id).addEventListener("change", updateFacetCounts);
             });
+            updateFacetCounts();
         })
-        .catch(error => console.error(`${columnName} データ取得エラー:`, error));
+        .catch(error => console.error("選択肢の取得エラー:", error));
 }
 
+// 選択中の条件で各選択肢の件数を表示し、0件になる選択肢は選べないようにする
+function updateFacetCounts() {
+    const queryParams = new URLSearchParams({
+        q: document.getElementById('search-input').value,
+        type: document.getElementById('type-input').value,
+        players: document.getElementById('players-input').value,
+        level: document.getElementById('level-input').value,
+        channel: document.getElementById('channel-input').value,
+    }).toString();
 
-
-
-function populateLevelSelect() {
-    fetch("/get_levels")
+    fetch(`/search/facets?${queryParams}`)
         .then(response => response.json())
-        .then(data => {
-            const select = document.getElementById("level-input");
-            data.forEach(level => {
-                const option = document.createElement("option");
-                option.value = level.level;
-                option.textContent = level.level;
-                select.appendChild(option);
-            });
+        .then(counts => {
+            applyFacetCounts("type-input", counts.category_title);
+            applyFacetCounts("players-input", counts.players);
+            applyFacetCounts("level-input", counts.level);
+            applyFacetCounts("channel-input", counts.channel);
         })
-        .catch(error => console.error("データ取得エラー:", error));
+        .catch(error => console.error("件数の取得エラー:", error));
+}
 
+function applyFacetCounts(selectId, counts) {
+    document.getElementById(selectId).querySelectorAll("option").forEach(option => {
+        if (!option.value) return; // 「〜を選択」はそのまま
+        if (!option.dataset.label) option.dataset.label = option.textContent;
+        const count = counts[option.value] || 0;
+        option.textContent = `${option.dataset.label} (${count})`;
+        option.disabled = count === 0 && !option.selected;
+    });
 }
 
-function populateChannelSelect() {
-    fetch("/get_channels")
-        .then(response => response.json())
-        .then(data => {
-            const select = document.getElementById("channel-input");
-            data.forEach(channel => {
-                const option = document.createElement("option");
-                option.value = channel.id;
-                option.textContent = channel.channel_name;
-                select.appendChild(option);
-            });
-            const ul = document.querySelector(".right-half ul");
-            ul.innerHTML = ""; // リストをクリア
-            data.forEach(channel => {
-                const li = document.createElement("li");
-                const a = document.createElement("a");
-                a.textContent = channel.channel_name;
-                a.href = channel.channel_link; // URLをセット（DBから取得）
-                a.target = "_blank"; // 新しいタブで開く
-                a.rel = "noopener noreferrer"; // セキュリティ対策
-                li.appendChild(a);
-                ul.appendChild(li);
-            });
-        })
-        .catch(error => console.error("データ取得エラー:", error));
+// ユニークな選択肢を設定する関数
+function populateSelect(selectId, data) {
+    const select = document.getElementById(selectId);
+    select.innerHTML = `<option value="">${selectId === "type-input" ? "カテゴリ" : "プレイヤー数"}を選択</option>`; // 初期値をセット
+
+    const n_vs_n = [];
+    const n_people = [];
+    const others = [];
+
+    data.forEach(value => {
+        let match;
+        if ((match = value.match(/^(\d+)対(\d+)$/))) {
+            // "n対n" の形式を解析
+            const num1 = parseInt(match[1], 10);
+            const num2 = parseInt(match[2], 10);
+            n_vs_n.push({ value, num1, num2 });
+        } else if ((match = value.match(/^(\d+)人$/))) {
+            // "n人" の形式を解析
+            const num = parseInt(match[1], 10);
+            n_people.push({ value, num });
+        } else {
+            // その他の値（例: "人数指定なし" など）
+            others.push(value);
+        }
+    });
+
+    // 数値順にソート
+    n_vs_n.sort((a, b) => a.num1 - b.num1 || a.num2 - b.num2);
+    n_people.sort((a, b) => a.num - b.num);
+    others.sort(); // それ以外は通常の文字列ソート
+
+    // 並び替えたリストを `<select>` に追加
+    [...n_vs_n.map(obj => obj.value), ...n_people.map(obj => obj.value), ...others].forEach(value => {
+        const option = document.createElement("option");
+        option.value = value;
+        option.textContent = value;
+        select.appendChild(option);
+    });
+}
+
+function populateLevelSelect(data) {
+    const select = document.getElementById("level-input");
+    data.forEach(level => {
+        const option = document.createElement("option");
+        option.value = level.level;
+        option.textContent = level.level;
+        select.appendChild(option);
+    });
+}
+
+function populateChannelSelect(data) {
+    const select = document.getElementById("channel-input");
+    data.forEach(channel => {
+        const option = document.createElement("option");
+        option.value = channel.id;
+        option.textContent = channel.channel_name;
+        select.appendChild(option);
+    });
+    const ul = document.querySelector(".right-half ul");
+    ul.innerHTML = ""; // リストをクリア
+    data.forEach(channel => {
+        const li = document.createElement("li");
+        const a = document.createElement("a");
+        a.textContent = channel.channel_name;
+        a.href = channel.channel_link; // URLをセット（DBから取得）
+        a.target = "_blank"; // 新しいタブで開く
+        a.rel = "noopener noreferrer"; // セキュリティ対策
+        li.appendChild(a);
+        ul.appendChild(li);
+    });
 }
 
 // カード表示用関数
@@ -155,6 +183,8 @@ function fetchData(endpoint, queryParams, limit) {
             updatePaginationButtons(); // ボタンの状態を更新
             togglePaginationVisibility(data.total);
 
+            pageCursors[currentPage] = data.next_cursor; // 次ページ用のカーソルを保存
+
             updateVideoCount(data.current_display_count, data.total);
         })
         .catch(error => console.error('エラー:', error));
@@ -169,9 +199,11 @@ function togglePaginationVisibility(totalResults) {
 
 // 検索処理
 function search(resetPage = true) {
-    if (resetPage) currentPage = 1;
+    if (resetPage) {
+        currentPage = 1;
+    }
 
-    const queryParams = new URLSearchParams({
+    const params = {
         q: document.getElementById('search-input').value,
         type: document.getElementById('type-input').value,
         players: document.getElementById('players-input').value,
@@ -179,8 +211,18 @@ function search(resetPage = true) {
         channel: document.getElementById('channel-input').value,
         sort: document.getElementById('sort-input').value,
         limit: getLimit(),
-        offset: (currentPage - 1) * getLimit(),
-    }).toString();
+    };
+    // 条件・並び替えが変わっていれば、前の条件で保存したカーソルは使わない
+    const query = new URLSearchParams(params).toString();
+    if (resetPage || query !== cursorQuery) {
+        pageCursors = [null];
+        cursorQuery = query;
+    }
+    params.offset = (currentPage - 1) * getLimit();
+    // 前ページのカーソルが分かっていれば OFFSET ではなくカーソルで続きを取得
+    const cursor = pageCursors[currentPage - 1];
+    if (cursor) params.cursor = cursor;
+    const queryParams = new URLSearchParams(params).toString();
 
     fetchData('/search', queryParams, getLimit());
 }
@@ -193,6 +235,8 @@ function getLimit() {
 
 let currentPage = 1;
 let totalPages = 1;
+let pageCursors = [null]; // pageCursors[n] は n+1 ページ目を取得するためのカーソル
+let cursorQuery = null; // pageCursors を保存したときの検索条件
 
 // ページ変更処理
 function goToPage(page) {
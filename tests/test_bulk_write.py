@@ -0,0 +1,177 @@
+import os
+import psycopg2
+import pytest
+from datetime import datetime, timezone
+from utilities import bulk_write
+from utilities.bulk_write import (
+    CATEGORY_COLUMNS, CONTENTS_COLUMNS, STATS_COMPARE_COLUMNS, batched, bulk_update, bulk_upsert, category_rows,
+    contents_rows, merge_query, stats_rows, to_count, update_query, write_tables,
+)
+from utilities.ingest_pipeline import StreamEnd, write_streams
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+
+def video(video_id, like_count='10', view_count='100'):
+    return {
+        'id': video_id, 'title': 'パス練習', 'upload_date': '2024-01-01T00:00:00Z',
+        'url': f'https://www.youtube.com/watch?v={video_id}', 'view_count': view_count,
+        'like_count': like_count, 'duration': '0:05:00',
+    }
+
+
+def test_batched_splits_rows():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(batched([], 2)) == []
+
+def test_to_count():
+    assert to_count('12') == 12
+    assert to_count('N/A') is None
+    assert to_count('abc', 'v1') is None
+
+def test_contents_rows_follow_column_order():
+    rows = contents_rows([video('v1'), video('v2', 'N/A')], 3)
+    assert len(rows[0]) == len(CONTENTS_COLUMNS)
+    row = dict(zip(CONTENTS_COLUMNS, rows[0]))
+    assert row['like_count'] == 10
+    assert row['channel_category'] == 3
+    assert row['duration_seconds'] == 300
+    assert row['embed_url'] == 'https://www.youtube.com/embed/v1'
+    assert row['popularity'] > 0
+    assert dict(zip(CONTENTS_COLUMNS, rows[1]))['like_count'] is None
+
+def test_contents_rows_convert_view_count():
+    # 詳細を取得できなかった動画の 'N/A' は INTEGER のカラムに入らないので NULL にする
+    rows = contents_rows([video('v1'), video('v2', view_count='N/A')], 3)
+    assert dict(zip(CONTENTS_COLUMNS, rows[0]))['view_count'] == 100
+    assert dict(zip(CONTENTS_COLUMNS, rows[1]))['view_count'] is None
+
+def test_category_rows():
+    data = [{'id': 'v1', 'category': 'パス', 'nop': '2人', 'level': '初級'}]
+    assert category_rows(data, 1) == [('v1', 'パス', '2人', '初級', 1)]
+
+def test_merge_query_do_nothing_and_update():
+    query = merge_query('category', ('id', 'level'))
+    assert 'SELECT DISTINCT ON (id) id, level FROM category_staging' in query
+    assert query.endswith('ON CONFLICT (id) DO NOTHING')
+
+    query = merge_query('contents', ('id', 'view_count'), update_columns=('view_count',))
+    assert 'DO UPDATE SET view_count = EXCLUDED.view_count' in query
+    assert 'WHERE (contents.view_count) IS DISTINCT FROM (EXCLUDED.view_count)' in query
+
+def test_stats_rows_skip_missing_videos():
+    published_at = {'v1': datetime(2024, 1, 1, tzinfo=timezone.utc), 'v2': None}
+    details = [
+        {'id': 'v1', 'statistics': {'viewCount': '500', 'likeCount': '20'}},
+        {'id': 'v2', 'statistics': {'viewCount': '7'}},  # いいね数が非公開
+        {'id': 'v3', 'statistics': {'viewCount': '1'}},  # 登録されていない動画
+        {'id': 'v1-private'},
+    ]
+    rows = stats_rows(published_at, details)
+    assert [row[:3] for row in rows] == [('v1', 500, 20), ('v2', 7, None)]
+    assert rows[0][3] > rows[1][3]
+    assert stats_rows(published_at, []) == []
+
+def test_update_query_only_touches_changed_rows():
+    query = update_query('contents', ('id', 'view_count', 'like_count', 'popularity'), compare_columns=STATS_COMPARE_COLUMNS)
+    assert query.startswith('UPDATE contents SET view_count = s.view_count, like_count = s.like_count, popularity = s.popularity')
+    assert 'WHERE contents.id = s.id AND (contents.view_count, contents.like_count) IS DISTINCT FROM (s.view_count, s.like_count)' in query
+    assert 'INSERT' not in query
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+
+    def execute(self, query):
+        self.conn.statements.append(query)
+        self.rowcount = 1
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+@pytest.fixture
+def failing_category_staging(monkeypatch):
+    def execute_values(c, query, batch, page_size):
+        if query.startswith('INSERT INTO category_staging'):
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        c.conn.statements.append(query)
+    monkeypatch.setattr(bulk_write, 'execute_values', execute_values)
+
+
+def chunk_writes(video_data):
+    contents_data = [{'id': d['id'], 'category': 'パス', 'nop': '2人', 'level': '初級'} for d in video_data]
+    return [('contents', CONTENTS_COLUMNS, contents_rows(video_data, 1)),
+            ('category', CATEGORY_COLUMNS, category_rows(contents_data, 1))]
+
+
+def test_write_tables_commits_once(monkeypatch):
+    monkeypatch.setattr(bulk_write, 'execute_values', lambda c, query, batch, page_size: None)
+    conn = FakeConnection()
+    assert write_tables(conn, chunk_writes([video('v1'), video('v2')])) == [1, 1]
+    assert conn.commits == 1
+    assert 'TRUNCATE contents_staging' in conn.statements  # コミットしないので一時テーブルは自分で空にする
+
+
+def test_failed_category_write_rolls_back_contents_and_keeps_watermark(failing_category_staging):
+    conn = FakeConnection()
+    with pytest.raises(psycopg2.OperationalError):
+        write_tables(conn, chunk_writes([video('v1')]))
+    assert conn.commits == 0  # contents の行もコミットしない
+    assert conn.rollbacks >= 1
+
+    def write(key, video_data, contents_data):
+        try:
+            write_tables(FakeConnection(), chunk_writes(video_data))
+        except psycopg2.Error:
+            return False
+        return True
+
+    events = [('CH1', ([video('v1')], [])), ('CH1', StreamEnd())]
+    updated = []
+    failed = write_streams(events, write, {'CH1': None}, lambda key, latest: updated.append((key, latest)))
+    assert failed == {'CH1'}
+    assert updated == []  # 次回同じチャンクを取得し直せるようにウォーターマークは進めない
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+def test_bulk_upsert_merges_batches():
+    import psycopg2
+    conn = psycopg2.connect(TEST_DATABASE_URL)
+    try:
+        with conn.cursor() as c:
+            c.execute("DROP TABLE IF EXISTS bulk_write_test")
+            c.execute("CREATE TABLE bulk_write_test (id TEXT PRIMARY KEY, level TEXT)")
+        conn.commit()
+        rows = [('v1', 'A'), ('v2', 'B'), ('v1', 'A'), ('v3', 'C')]
+        assert bulk_upsert(conn, 'bulk_write_test', ('id', 'level'), rows, batch_size=2) == 3
+        assert bulk_upsert(conn, 'bulk_write_test', ('id', 'level'), [('v1', 'Z')], update_columns=('level',)) == 1
+        # 既存の行のうち値が変わったものだけ更新し、ない行は追加しない
+        assert bulk_update(conn, 'bulk_write_test', ('id', 'level'), [('v2', 'B'), ('v3', 'D'), ('v9', 'X')]) == 1
+        with conn.cursor() as c:
+            c.execute("SELECT id, level FROM bulk_write_test ORDER BY id")
+            assert c.fetchall() == [('v1', 'Z'), ('v2', 'B'), ('v3', 'D')]
+    finally:
+        conn.rollback()
+        with conn.cursor() as c:
+            c.execute("DROP TABLE IF EXISTS bulk_write_test")
+        conn.commit()
+        conn.close()
@@ -0,0 +1,34 @@
+from utilities.catalog_watcher import CatalogWatcher
+
+def test_check_calls_subscribers_only_when_version_changes():
+    versions = [1, 1, 2]
+    seen = []
+    watcher = CatalogWatcher(lambda: versions.pop(0), poll_interval=0)
+    watcher.subscribe(seen.append)
+    assert watcher.check() == 1
+    assert watcher.check() == 1
+    assert watcher.check() == 2
+    assert seen == [1, 2]
+
+def test_check_respects_poll_interval():
+    calls = []
+    watcher = CatalogWatcher(lambda: calls.append(1) or len(calls), poll_interval=60)
+    watcher.check()
+    watcher.check()
+    assert calls == [1]
+    watcher.check(force=True)
+    assert calls == [1, 1]
+
+def test_failed_version_load_keeps_current_version():
+    watcher = CatalogWatcher(lambda: None, poll_interval=0)
+    assert watcher.check() is None
+
+def test_version_is_published_after_subscribers_finish():
+    versions = [1, 2]
+    seen = []
+    watcher = CatalogWatcher(lambda: versions.pop(0), poll_interval=0)
+    watcher.subscribe(lambda version: seen.append((version, watcher.version)))
+    watcher.check()
+    watcher.check()
+    assert seen == [(1, None), (2, 1)]
+    assert watcher.version == 2
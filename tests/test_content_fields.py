@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta, timezone
+from utilities.content_fields import convert_to_embed_url, derived_content_fields, duration_to_seconds, parse_upload_date
+
+def test_parse_upload_date():
+    published_at, display = parse_upload_date('2023-11-22T02:00:00Z')
+    assert published_at == datetime(2023, 11, 22, 2, 0, tzinfo=timezone.utc)
+    assert display == '2023年11月22日02時00分'
+
+    published_at, display = parse_upload_date('2023年11月22日11時00分')
+    assert published_at == datetime(2023, 11, 22, 2, 0, tzinfo=timezone.utc)  # 日本時間として扱う
+    assert display == '2023年11月22日11時00分'
+
+    assert parse_upload_date('yesterday') == (None, None)
+
+def test_duration_to_seconds():
+    assert duration_to_seconds('0:15:00') == 900
+    assert duration_to_seconds('1:02:03') == 3723
+    assert duration_to_seconds(str(timedelta(days=1, minutes=1))) == 86460
+    assert duration_to_seconds('N/A') is None
+
+def test_derived_content_fields():
+    fields = derived_content_fields('2025-03-01T00:00:00Z', '0:01:30', 'https://www.youtube.com/watch?v=abc')
+    assert fields['duration_seconds'] == 90
+    assert fields['embed_url'] == convert_to_embed_url('https://www.youtube.com/watch?v=abc') == 'https://www.youtube.com/embed/abc'
+    assert fields['upload_date_display'] == '2025年03月01日00時00分'
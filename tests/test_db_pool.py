@@ -0,0 +1,145 @@
+import logging
+import pytest
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+from psycopg2.pool import PoolError
+from utilities.db_pool import InstrumentedPool, ReadRouter
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query):
+        if self.conn.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.status = TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+def make_pool(maxconn=2, **kwargs):
+    kwargs.setdefault('checkout_timeout', 0.01)
+    return InstrumentedPool(1, maxconn, connect=FakeConnection, **kwargs)
+
+def test_checkout_and_return_reuses_connection():
+    pool = make_pool()
+    conn = pool.getconn()
+    assert pool.stats()['in_use'] == 1
+    conn.status = TRANSACTION_STATUS_INTRANS
+    pool.putconn(conn)
+    assert conn.rollbacks == 1  # 未完了のトランザクションはロールバックして返却
+    assert pool.getconn() is conn
+    assert pool.stats()['checkouts'] == 2
+
+def test_exhausted_pool_times_out():
+    pool = make_pool(maxconn=1)
+    pool.getconn()
+    with pytest.raises(PoolError):
+        pool.getconn()
+    assert pool.stats()['timeouts'] == 1
+
+def test_health_check_discards_broken_connection():
+    pool = make_pool(health_check_idle=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.broken = True
+    assert pool.getconn() is not conn
+    assert conn.closed
+    assert pool.stats()['discarded'] == 1
+
+def test_leak_detection_logs_once(caplog):
+    pool = make_pool(leak_seconds=0)
+    pool.getconn(owner='/search')
+    with caplog.at_level(logging.WARNING):
+        pool.check_leaks()
+        pool.check_leaks()
+    assert pool.stats()['leaks_reported'] == 1
+    assert '/search' in caplog.text
+
+
+def unreachable():
+    raise psycopg2.OperationalError("could not connect to server")
+
+def test_read_router_round_robin_across_replicas():
+    replicas = [make_pool(), make_pool()]
+    router = ReadRouter(make_pool(), replicas)
+    first, second = router.getconn(), router.getconn()
+    assert replicas[0].stats()['in_use'] == 1
+    assert replicas[1].stats()['in_use'] == 1
+    router.putconn(first)
+    router.putconn(second)
+    assert [r.stats()['in_use'] for r in replicas] == [0, 0]
+
+def test_read_router_fails_over_to_primary():
+    primary = make_pool()
+    down = InstrumentedPool(0, 2, connect=unreachable, checkout_timeout=0.01)
+    router = ReadRouter(primary, [down], retry_seconds=60)
+    conn = router.getconn()
+    assert primary.stats()['in_use'] == 1
+    router.putconn(conn)
+    assert primary.stats()['in_use'] == 0
+
+    router.getconn()  # 停止中のレプリカは retry_seconds の間は試さない
+    stats = router.stats()
+    assert stats['failovers'] == 1
+    assert stats['replicas'][0]['available'] is False
+
+def test_read_router_without_replicas_uses_primary():
+    primary = make_pool()
+    router = ReadRouter(primary)
+    router.getconn()
+    assert primary.stats()['in_use'] == 1
+
+def test_read_router_failover_after_query_error_uses_primary():
+    primary, replica = make_pool(), make_pool()
+    router = ReadRouter(primary, [replica], retry_seconds=60)
+    conn = router.getconn()
+    assert replica.stats()['in_use'] == 1
+
+    retry = router.failover(conn, psycopg2.OperationalError("server closed the connection unexpectedly"))
+    assert conn.closed  # 切れた接続はプールに戻さない
+    assert replica.stats()['in_use'] == 0 and replica.stats()['idle'] == 0
+    assert primary.stats()['in_use'] == 1
+    router.putconn(retry)
+    assert primary.stats()['in_use'] == 0
+
+    stats = router.stats()
+    assert stats['failovers'] == 1
+    assert stats['replicas'][0]['available'] is False
+    router.getconn()  # 停止中のレプリカは使わない
+    assert replica.stats()['in_use'] == 0
+
+def test_read_router_failover_on_primary_connection_raises():
+    primary = make_pool()
+    router = ReadRouter(primary)
+    conn = router.getconn()
+    error = psycopg2.OperationalError("server closed the connection unexpectedly")
+    with pytest.raises(psycopg2.OperationalError):
+        router.failover(conn, error)
+    assert conn.closed
+    assert primary.stats()['in_use'] == 0
@@ -0,0 +1,85 @@
+from datetime import datetime
+from utilities.facet_index import FacetIndex
+
+def row(video_id, upload_date, view_count, category, players='人数指定なし', level='小学生以上', channel=1):
+    published_at = datetime.fromisoformat(upload_date + 'T00:00:00+00:00')
+    content = (video_id, f'title {video_id}', upload_date, 'url', view_count, None, '0:01:00', 'ch', published_at, 0.0)
+    return content + (category, players, level, channel)
+
+ROWS = [
+    row('a', '2024-01-01', 10, 'パス'),
+    row('b', '2024-02-01', 30, 'ドリブル', channel=2),
+    row('c', '2024-03-01', 20, 'パス', level='中学生'),
+    row('d', '2024-04-01', 20, 'パス', channel=2),
+]
+
+def ids(page):
+    rows, total = page
+    return [r[0] for r in rows], total
+
+def test_search_filters_and_sorts():
+    index = FacetIndex.build(ROWS)
+    assert ids(index.search({'type_filter': 'パス'}, 'upload_date', 10, 0)) == (['d', 'c', 'a'], 3)
+    assert ids(index.search({'type_filter': 'パス', 'channel_filter': '2'}, 'upload_date', 10, 0)) == (['d'], 1)
+    # 同じ値は ID の降順（ORDER BY view_count DESC, ID DESC と同じ）
+    assert ids(index.search({}, 'view_count', 10, 0)) == (['b', 'd', 'c', 'a'], 4)
+    assert ids(index.search({}, 'view_count', 2, 1)) == (['d', 'c'], 4)
+
+def test_search_with_zero_limit_returns_no_rows():
+    index = FacetIndex.build(ROWS)
+    assert ids(index.search({}, 'view_count', 0, 0)) == ([], 4)
+
+def test_search_with_cursor():
+    index = FacetIndex.build(ROWS)
+    assert ids(index.search({}, 'view_count', 2, 0, cursor=(20, 'd'))) == (['c', 'a'], 4)
+
+def test_update_adds_changes_and_removes_rows():
+    index = FacetIndex.build(ROWS)
+    index.update([
+        row('a', '2024-01-01', 50, 'パス'),
+        row('b', '2024-02-01', 30, 'シュート', channel=2),
+        row('c', '2024-03-01', 20, 'パス', level='中学生'),
+        row('e', '2024-05-01', 1, 'パス'),
+    ])
+    assert len(index) == 4
+    assert ids(index.search({'type_filter': 'パス'}, 'view_count', 10, 0)) == (['a', 'c', 'e'], 3)
+    assert ids(index.search({'type_filter': 'ドリブル'}, 'view_count', 10, 0)) == ([], 0)
+
+def test_facet_counts_exclude_own_filter():
+    index = FacetIndex.build(ROWS)
+    counts = index.facet_counts({'type_filter': 'パス', 'channel_filter': '2'})
+    assert counts['category_title'] == {'パス': 1, 'ドリブル': 1}
+    assert counts['channel'] == {'1': 2, '2': 1}
+    assert counts['level'] == {'小学生以上': 1}
+
+def test_search_with_upload_date_cursor():
+    index = FacetIndex.build(ROWS)
+    cursor = (datetime.fromisoformat('2024-03-01T00:00:00+00:00'), 'c')
+    assert ids(index.search({}, 'upload_date', 10, 0, cursor=cursor)) == (['b', 'a'], 4)
+
+def test_range_filters_fall_back_to_database():
+    index = FacetIndex.build(ROWS)
+    assert index.search({'max_duration': 300}, 'upload_date', 10, 0) is None
+    assert index.facet_counts({'min_duration': 60}) is None
+
+def test_search_is_not_blocked_while_update_rebuilds():
+    index = FacetIndex.build(ROWS)
+    seen = []
+
+    def rows():
+        # 作り直しの途中でも（同じスレッドから呼んでもデッドロックせずに）古いインデックスで検索できる
+        seen.append(ids(index.search({}, 'view_count', 10, 0)))
+        yield row('e', '2024-05-01', 99, 'パス')
+
+    index.update(rows())
+    assert seen == [(['b', 'd', 'c', 'a'], 4)]
+    assert ids(index.search({}, 'view_count', 10, 0)) == (['e'], 1)
+
+def test_null_sort_values_come_last():
+    undated = row('z', '2024-01-01', 5, 'パス')
+    undated = undated[:8] + (None,) + undated[9:]  # 日付を読み取れなかった動画
+    index = FacetIndex.build(ROWS + [undated])
+    assert ids(index.search({}, 'upload_date', 10, 0)) == (['d', 'c', 'b', 'a', 'z'], 5)
+    # 最後の日付ありの行のカーソルから続けると NULL の行が返る
+    cursor = (datetime.fromisoformat('2024-01-01T00:00:00+00:00'), 'a')
+    assert ids(index.search({}, 'upload_date', 10, 0, cursor=cursor)) == (['z'], 5)
@@ -11,7 +11,7 @@ def test_convert_duration():
 def test_fetch_video_details(mocker):
     mock_response = mocker.Mock()
     mock_response.json.return_value = {'items': [{'id': 'video1', 'statistics': {'viewCount': '1000'}, 'contentDetails': {'duration': 'PT10M'}}]}
-    mocker.patch('requests.get', return_value=mock_response)
+    mocker.patch('requests.Session.get', return_value=mock_response)
     api_key = 'test_api_key'
     video_ids = ['video1']
     details = fetch_video_details(video_ids, api_key)
@@ -19,10 +19,18 @@ def test_fetch_video_details(mocker):
     assert details[0]['id'] == 'video1'
     assert details[0]['statistics']['viewCount'] == '1000'
 
+def test_fetch_video_details_raises_after_retries(mocker):
+    # 失敗を空の結果にすると再生回数が 'N/A' のまま書き込まれるので呼び出し元に伝える
+    mock_response = mocker.Mock(ok=False, status_code=403)
+    mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError("403 Forbidden")
+    mocker.patch('requests.Session.get', return_value=mock_response)
+    with pytest.raises(requests.exceptions.RequestException):
+        fetch_video_details(['video1'], 'test_api_key')
+
 def test_fetch_videos_from_channel(mocker):
     mock_response = mocker.Mock()
     mock_response.json.return_value = {'items': [{'id': {'videoId': 'video1'}, 'snippet': {'title': 'Test Video', 'publishedAt': '2025-03-01T00:00:00Z'}}]}
-    mocker.patch('requests.get', return_value=mock_response)
+    mocker.patch('requests.Session.get', return_value=mock_response)
     api_key = 'test_api_key'
     channel_id = 'test_channel_id'
     data = fetch_videos_from_channel(channel_id, api_key)
@@ -30,3 +38,59 @@ def test_fetch_videos_from_channel(mocker):
     assert len(data['items']) == 1
     assert data['items'][0]['id']['videoId'] == 'video1'
     assert data['items'][0]['snippet']['title'] == 'Test Video'
+
+def search_page(items, next_page_token=None):
+    page = {'items': [
+        {'id': {'videoId': video_id}, 'snippet': {'title': video_id, 'channelId': 'ch', 'publishedAt': published_at}}
+        for video_id, published_at in items
+    ]}
+    if next_page_token:
+        page['nextPageToken'] = next_page_token
+    return page
+
+def test_iter_youtube_video_data_stops_at_watermark(mocker):
+    from datetime import datetime, timezone
+    from utilities.get_videos import iter_youtube_video_data, latest_upload_date
+
+    pages = [
+        search_page([('new2', '2024-03-02T00:00:00Z'), ('new1', '2024-03-01T00:00:00Z')], 'page2'),
+        search_page([('new0', '2024-02-15T00:00:00Z'), ('old', '2024-02-01T00:00:00Z')], 'page3'),
+        search_page([('older', '2024-01-01T00:00:00Z')]),
+    ]
+    mocker.patch('utilities.get_videos.fetch_videos_from_channel', side_effect=pages)
+    details = mocker.patch('utilities.get_videos.fetch_video_details', return_value=[])
+
+    watermark = datetime(2024, 2, 1, tzinfo=timezone.utc)
+    video_data = [data for page in iter_youtube_video_data('ch', 'key', published_after=watermark) for data in page]
+    assert [data['id'] for data in video_data] == ['new2', 'new1', 'new0']
+    assert details.call_count == 2  # 取り込み済みの動画に達したページで止める
+    assert details.call_args_list[1][0][0] == ['new0']
+    assert latest_upload_date(video_data) == datetime(2024, 3, 2, tzinfo=timezone.utc)
+    assert latest_upload_date([]) is None
+
+def test_fetch_videos_from_channel_passes_published_after(mocker):
+    from datetime import datetime, timedelta, timezone
+    mock_response = mocker.Mock()
+    mock_response.json.return_value = {'items': []}
+    get = mocker.patch('requests.Session.get', return_value=mock_response)
+    after = datetime(2024, 2, 1, 9, 0, tzinfo=timezone(timedelta(hours=9)))
+    fetch_videos_from_channel('ch', 'key', published_after=after)
+    url = get.call_args[0][0]
+    assert '&order=date' in url
+    assert '&publishedAfter=2024-02-01T00:00:00Z' in url
+
+def test_get_channels_details_batches_ids(mocker):
+    from utilities.get_channel_id import get_channels_details
+    def fake_get(url, **kwargs):
+        ids = url.split('&id=')[1].split('&')[0].split(',')
+        response = mocker.Mock()
+        response.json.return_value = {'items': [
+            {'id': cid, 'brandingSettings': {'channel': {'title': f'name {cid}'}}} for cid in ids if cid != 'gone'
+        ]}
+        return response
+    get = mocker.patch('requests.Session.get', side_effect=fake_get)
+    channel_ids = [f'ch{i}' for i in range(60)] + ['gone']
+    names = get_channels_details(channel_ids, 'key')
+    assert get.call_count == 2  # 50件ずつまとめて取得
+    assert names['ch59'] == 'name ch59'
+    assert names['gone'] == 'N/A'
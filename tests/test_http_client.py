@@ -0,0 +1,69 @@
+import pytest
+import requests
+from utilities import http_client
+from utilities.rate_limit import TokenBucket
+
+
+def response(mocker, status_code, body=None, headers=None):
+    mock = mocker.Mock()
+    mock.status_code = status_code
+    mock.ok = status_code < 400
+    mock.headers = headers or {}
+    mock.json.return_value = body or {}
+    if status_code >= 400:
+        mock.raise_for_status.side_effect = requests.exceptions.HTTPError(f"{status_code} Error")
+    return mock
+
+
+@pytest.fixture(autouse=True)
+def no_wait(mocker, monkeypatch):
+    monkeypatch.setattr(http_client, 'rate_limiter', TokenBucket(0))
+    monkeypatch.setattr(http_client, '_stats', {})
+    return mocker.patch('utilities.http_client.time.sleep')
+
+
+def test_retries_transient_errors_with_backoff(mocker, no_wait):
+    get = mocker.patch('requests.Session.get', side_effect=[
+        response(mocker, 503),
+        requests.exceptions.ConnectionError("reset"),
+        response(mocker, 429, headers={'Retry-After': '2'}),
+        response(mocker, 200, {'items': [1]}),
+    ])
+    assert http_client.get_json('http://api/videos', endpoint='videos') == {'items': [1]}
+    assert get.call_count == 4
+    assert no_wait.call_count == 3
+    assert no_wait.call_args_list[2][0][0] >= 2  # Retry-After 以上待つ
+
+    stats = http_client.stats()['videos']
+    assert stats['requests'] == 4
+    assert stats['retries'] == 3
+    assert stats['errors'] == 3
+
+def test_gives_up_after_max_retries(mocker, monkeypatch):
+    monkeypatch.setattr(http_client, 'MAX_RETRIES', 2)
+    get = mocker.patch('requests.Session.get', return_value=response(mocker, 500))
+    with pytest.raises(requests.exceptions.HTTPError):
+        http_client.get_json('http://api/search', endpoint='search')
+    assert get.call_count == 3
+
+def test_client_errors_are_not_retried(mocker):
+    get = mocker.patch('requests.Session.get', return_value=response(mocker, 403))
+    with pytest.raises(requests.exceptions.HTTPError):
+        http_client.get_json('http://api/search', endpoint='search')
+    assert get.call_count == 1
+
+def test_backoff_is_bounded(monkeypatch):
+    monkeypatch.setattr(http_client, 'BACKOFF_MAX', 4)
+    for attempt in range(10):
+        assert 0 <= http_client.backoff_seconds(attempt) <= 4
+    assert http_client.backoff_seconds(0, '3') >= 3
+
+def test_session_is_reused_per_thread():
+    assert http_client.get_session() is http_client.get_session()
+
+def test_transient_error_does_not_end_crawl(mocker):
+    from utilities.get_videos import fetch_videos_from_channel
+    mocker.patch('requests.Session.get', side_effect=[
+        response(mocker, 500), response(mocker, 200, {'items': [{'id': {'videoId': 'v1'}}]}),
+    ])
+    assert fetch_videos_from_channel('ch', 'key')['items'][0]['id']['videoId'] == 'v1'
@@ -0,0 +1,117 @@
+import threading
+import time
+from utilities.ingest_pipeline import StreamCancelled, StreamEnd, classify, rechunk, stream_concurrently, write_streams
+
+
+def test_rechunk_regroups_pages():
+    pages = iter([[1, 2, 3], [], [4], [5, 6, 7, 8, 9]])
+    assert list(rechunk(pages, 4)) == [[1, 2, 3, 4], [5, 6, 7, 8], [9]]
+    assert list(rechunk(iter([]), 4)) == []
+
+def test_classify_adds_category_rows():
+    chunk = [{'id': 'v1', 'title': '2対1のパス練習'}]
+    ((video_data, category_data),) = list(classify([chunk]))
+    assert video_data is chunk
+    assert category_data == [{'id': 'v1', 'category': '対人', 'nop': '2対1', 'level': '小学生以上'}]
+
+def test_stages_are_lazy():
+    pulled = []
+
+    def pages():
+        for i in range(100):
+            pulled.append(i)
+            yield [i]
+
+    stream = rechunk(pages(), 2)
+    assert next(stream) == [0, 1]
+    assert pulled == [0, 1]  # 必要な分しかページを読まない
+
+def test_streams_run_concurrently_and_end_per_task():
+    started = threading.Barrier(3, timeout=2)  # 3件が同時に実行されないと待ち合わせできない
+
+    def produce(name, count):
+        started.wait()
+        for i in range(count):
+            yield f"{name}{i}"
+
+    tasks = [('a', ('a', 2)), ('b', ('b', 0)), ('c', ('c', 1))]
+    events = list(stream_concurrently(tasks, produce, max_workers=3))
+    values = [(key, value) for key, value in events if not isinstance(value, StreamEnd)]
+    ends = [key for key, value in events if isinstance(value, StreamEnd)]
+    assert sorted(values) == [('a', 'a0'), ('a', 'a1'), ('c', 'c0')]
+    assert sorted(ends) == ['a', 'b', 'c']
+    assert events.index(('a', 'a1')) < events.index(('a', StreamEnd()))
+
+def test_failed_stream_reports_error():
+    def produce(value):
+        yield value
+        raise RuntimeError("boom")
+
+    events = list(stream_concurrently([(1, (1,))], produce))
+    assert events[0] == (1, 1)
+    assert isinstance(events[1][1].error, RuntimeError)
+
+def test_slow_writer_applies_backpressure():
+    produced = []
+
+    def produce():
+        for i in range(50):
+            produced.append(i)
+            yield i
+
+    stream = stream_concurrently([('a', ())], produce, max_workers=1, queue_size=2)
+    assert next(stream) == ('a', 0)
+    time.sleep(0.2)
+    assert len(produced) <= 4  # キューがいっぱいの間は取得側が待つ
+    stream.close()
+
+
+def test_write_streams_advances_watermark_only_for_completed_keys():
+    def chunk(video_id, upload_date):
+        return [{'id': video_id, 'upload_date': upload_date}], []
+
+    events = [
+        ('a', chunk('a1', '2024-02-01T00:00:00Z')),
+        ('b', chunk('b1', '2024-03-01T00:00:00Z')),
+        ('c', chunk('c1', '2024-04-01T00:00:00Z')),
+        ('a', StreamEnd()),
+        ('b', StreamEnd(RuntimeError("page 2 failed"))),
+        ('c', chunk('c2', '2024-05-01T00:00:00Z')),
+        ('c', StreamEnd()),
+        ('d', StreamEnd()),
+    ]
+    updated = {}
+    failed = write_streams(events, lambda key, video_data, contents_data: video_data[0]['id'] != 'c1',
+                           dict.fromkeys('abcd'), updated.__setitem__)
+    assert failed == {'b', 'c'}
+    assert list(updated) == ['a', 'd']
+    assert updated['a'].isoformat() == '2024-02-01T00:00:00+00:00'
+    assert updated['d'] is None  # 新しい動画がなければウォーターマークはそのまま
+
+def test_failed_write_stops_that_producer():
+    pulled = {'a': 0, 'b': 0}
+
+    def produce(key):
+        for i in range(50):
+            pulled[key] += 1  # ページの取得（API の呼び出し）の代わり
+            yield [{'id': f'{key}{i}', 'upload_date': '2024-01-01T00:00:00Z'}], []
+
+    cancelled = set()
+    events = []
+
+    def write(key, video_data, contents_data):
+        return key != 'a'
+
+    def record(stream):
+        for event in stream:
+            events.append(event)
+            yield event
+
+    stream = stream_concurrently([('a', ('a',)), ('b', ('b',))], produce, max_workers=2, queue_size=2, cancelled=cancelled)
+    failed = write_streams(record(stream), write, dict.fromkeys('ab'), lambda key, latest: None, cancelled.add)
+    assert failed == {'a'}
+    assert pulled['b'] == 50
+    assert pulled['a'] < 10  # 書き込みに失敗した後はキューに入っていた分しか取得しない
+    ends = {key: value for key, value in events if isinstance(value, StreamEnd)}
+    assert isinstance(ends['a'].error, StreamCancelled)
+    assert ends['b'].error is None
@@ -0,0 +1,49 @@
+import math
+import os
+import pytest
+from datetime import datetime, timedelta, timezone
+from utilities.popularity import POPULARITY_SQL, compute_popularity
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+NOW = datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+def test_compute_popularity():
+    scores = compute_popularity(
+        ['1000', 999, 'N/A', None],
+        [9, None, 'N/A', 0],
+        [NOW, NOW - timedelta(days=180), None, NOW],
+        now=NOW,
+    )
+    assert math.isclose(scores[0], math.log10(1001) + 2 * 1.0, rel_tol=1e-6)
+    assert math.isclose(scores[1], 3 * 0.75, rel_tol=1e-6)  # 半減期で新しさの重みが 0.75 倍
+    assert scores[2] == 0.0
+    assert scores[3] == 0.0
+
+def test_newer_and_more_liked_videos_rank_higher():
+    scores = compute_popularity([100, 100, 100], [10, 10, 50],
+                                [NOW - timedelta(days=400), NOW, NOW], now=NOW)
+    assert scores[0] < scores[1] < scores[2]
+
+def test_compute_popularity_empty():
+    assert compute_popularity([], [], []) == []
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+def test_popularity_sql_matches_compute_popularity():
+    import psycopg2
+    view_counts = [1000, 999, None, 0, 12345678]
+    like_counts = [9, None, 3, 0, 4567]
+    published_at = [NOW, NOW - timedelta(days=180), None, NOW, NOW - timedelta(days=2000)]
+    conn = psycopg2.connect(TEST_DATABASE_URL)
+    try:
+        with conn.cursor() as c:
+            c.execute("CREATE TEMP TABLE contents (id INTEGER, view_count INTEGER, like_count INTEGER, published_at TIMESTAMPTZ)")
+            c.executemany("INSERT INTO contents VALUES (%s, %s, %s, %s)",
+                          list(zip(range(len(view_counts)), view_counts, like_counts, published_at)))
+            c.execute(f"SELECT {POPULARITY_SQL} FROM contents ORDER BY id", {"now": NOW})
+            scores = [row[0] for row in c.fetchall()]
+    finally:
+        conn.rollback()
+        conn.close()
+    expected = compute_popularity(view_counts, like_counts, published_at, now=NOW)
+    assert scores == pytest.approx(expected, abs=1e-6)
@@ -0,0 +1,72 @@
+import pytest
+import psycopg2.errors
+from utilities.prepared_statements import PreparedStatements, to_positional
+from utilities.search_query import build_search_query
+
+
+class FakeConnection:
+    def __init__(self):
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakeCursor:
+    def __init__(self, conn, fail_execute=0):
+        self.connection = conn
+        self.executed = []
+        self.fail_execute = fail_execute
+
+    def execute(self, query, params=None):
+        if query.startswith("EXECUTE") and self.fail_execute:
+            self.fail_execute -= 1
+            raise psycopg2.errors.InvalidSqlStatementName("prepared statement does not exist")
+        self.executed.append((query, params))
+
+
+def test_to_positional_numbers_placeholders():
+    assert to_positional("a = %s AND b LIKE '%%x' AND c < %s") == "a = $1 AND b LIKE '%x' AND c < $2"
+
+def test_prepares_once_per_connection():
+    statements = PreparedStatements()
+    query, params = build_search_query('パス', {'type_filter': 'ドリブル'}, 'view_count', 10, 0)
+    c = FakeCursor(FakeConnection())
+    statements.execute(c, query, params)
+    _, other_params = build_search_query('シュート', {'type_filter': 'パス'}, 'view_count', 10, 20)
+    statements.execute(c, query, other_params)
+
+    prepares = [q for q, _ in c.executed if q.startswith("PREPARE")]
+    executes = [(q, p) for q, p in c.executed if q.startswith("EXECUTE")]
+    assert len(prepares) == 1
+    assert "$4" in prepares[0] and "%s" not in prepares[0]
+    assert executes[1][1] == other_params
+    assert statements.stats()['prepares'] == 1
+    assert statements.stats()['executes'] == 2
+
+    # 別の接続では改めて PREPARE する
+    other = FakeCursor(FakeConnection())
+    statements.execute(other, query, params)
+    assert statements.stats()['prepares'] == 2
+
+def test_deallocates_oldest_statement():
+    statements = PreparedStatements(max_per_connection=1)
+    c = FakeCursor(FakeConnection())
+    statements.execute(c, "SELECT 1", [])
+    statements.execute(c, "SELECT %s", [2])
+    assert any(q.startswith("DEALLOCATE search_") for q, _ in c.executed)
+    assert c.executed[-1] == ("EXECUTE " + c.executed[-3][0].split()[1] + " (%s)", [2])
+
+def test_prepares_again_when_missing_on_server():
+    statements = PreparedStatements()
+    conn = FakeConnection()
+    statements.execute(FakeCursor(conn), "SELECT %s", [1])
+    c = FakeCursor(conn, fail_execute=1)
+    statements.execute(c, "SELECT %s", [1])
+    assert conn.rollbacks == 1
+    assert [q.split()[0] for q, _ in c.executed] == ["DEALLOCATE", "PREPARE", "EXECUTE"]
+
+def test_gives_up_after_second_missing_statement():
+    c = FakeCursor(FakeConnection(), fail_execute=2)
+    with pytest.raises(psycopg2.errors.InvalidSqlStatementName):
+        PreparedStatements().execute(c, "SELECT %s", [1])
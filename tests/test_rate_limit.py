@@ -0,0 +1,38 @@
+import threading
+from utilities.rate_limit import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_bucket_allows_burst_then_paces():
+    clock = FakeClock()
+    bucket = TokenBucket(2, capacity=2, clock=clock, sleep=clock.sleep)
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0.5  # 1秒に2回なので3回目は0.5秒待つ
+    assert clock.now == 0.5
+    clock.now += 10
+    assert bucket.acquire() == 0  # 貯まるのは capacity まで
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0.5
+
+def test_unlimited_bucket_never_waits():
+    assert TokenBucket(0).acquire() == 0
+
+def test_bucket_is_shared_between_threads():
+    bucket = TokenBucket(1000, capacity=5)
+    threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(5)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert bucket.waited_seconds > 0  # 20回のうち capacity を超えた分は待つ
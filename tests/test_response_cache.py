@@ -0,0 +1,78 @@
+import os
+import time
+import pytest
+import requests
+from utilities import http_client
+from utilities.rate_limit import TokenBucket
+from utilities.response_cache import ResponseCache, cache_key
+
+
+def test_cache_key_strips_api_key_and_sorts_params():
+    key = cache_key('https://api/videos?key=SECRET&part=statistics&id=a,b')
+    assert 'SECRET' not in key
+    assert key == cache_key('https://api/videos?id=a,b&part=statistics&key=OTHER')
+    assert cache_key('https://api/videos', {'id': 'a', 'key': 'x'}) == 'https://api/videos?id=a'
+
+def test_put_and_get_round_trip(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.put('https://api/videos?key=SECRET&id=a', '"etag1"', {'items': ['ドリブル']})
+    entry = cache.get('https://api/videos?id=a&key=OTHER')
+    assert entry['etag'] == '"etag1"'
+    assert entry['body'] == {'items': ['ドリブル']}
+    assert all('SECRET' not in open(tmp_path / name, encoding='utf-8').read() for name in os.listdir(tmp_path))
+    assert cache.get('https://api/videos?id=b') is None
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=250)
+    body = {'items': ['x' * 50]}
+    cache.put('https://api/a', 'a', body)
+    cache.put('https://api/b', 'b', body)
+    past = time.time() - 100
+    for name in os.listdir(tmp_path):
+        os.utime(tmp_path / name, (past, past))
+    cache.get('https://api/a')  # a を使ったので b のほうが古くなる
+    cache.put('https://api/c', 'c', body)
+    assert cache.get('https://api/a') is not None
+    assert cache.get('https://api/b') is None
+    assert cache.get('https://api/c') is not None
+
+
+def response(mocker, status_code, body=None, etag=None):
+    mock = mocker.Mock()
+    mock.status_code = status_code
+    mock.ok = status_code < 400
+    mock.headers = {'ETag': etag} if etag else {}
+    mock.json.return_value = body
+    return mock
+
+
+@pytest.fixture
+def cached_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(http_client, 'rate_limiter', TokenBucket(0))
+    monkeypatch.setattr(http_client, '_stats', {})
+    http_client.configure_cache(str(tmp_path))
+    yield tmp_path
+    http_client.configure_cache(None)
+
+def test_not_modified_is_served_from_disk(mocker, cached_client):
+    get = mocker.patch('requests.Session.get', side_effect=[
+        response(mocker, 200, {'items': [1]}, etag='"v1"'),
+        response(mocker, 304),
+    ])
+    url = 'https://api/videos?key=SECRET&id=a'
+    assert http_client.get_json(url, endpoint='videos') == {'items': [1]}
+    assert http_client.get_json(url, endpoint='videos') == {'items': [1]}
+    assert get.call_args_list[0][1]['headers'] is None
+    assert get.call_args_list[1][1]['headers'] == {'If-None-Match': '"v1"'}
+    assert http_client.stats()['videos']['not_modified'] == 1
+
+def test_replay_mode_works_offline(mocker, cached_client):
+    mocker.patch('requests.Session.get', return_value=response(mocker, 200, {'items': [2]}, etag='"v2"'))
+    http_client.get_json('https://api/search?key=A&q=x', endpoint='search')
+
+    http_client.configure_cache(str(cached_client), mode='replay')
+    get = mocker.patch('requests.Session.get', side_effect=AssertionError("network used"))
+    assert http_client.get_json('https://api/search?q=x&key=B', endpoint='search') == {'items': [2]}
+    with pytest.raises(requests.exceptions.RequestException):
+        http_client.get_json('https://api/search?q=y', endpoint='search')
+    assert get.call_count == 0
@@ -0,0 +1,34 @@
+from utilities.search_cache import SearchCache
+
+def test_hit_and_miss():
+    cache = SearchCache(maxsize=2)
+    assert cache.get(('パス', 10, 0)) is None
+    cache.set(('パス', 10, 0), {'total': 3})
+    assert cache.get(('パス', 10, 0)) == {'total': 3}
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+def test_lru_eviction():
+    cache = SearchCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.stats()['evictions'] == 1
+
+def test_ttl_expiry():
+    cache = SearchCache(ttl=-1)
+    cache.set('a', 1)
+    assert cache.get('a') is None
+
+def test_invalidate_on_version_change():
+    cache = SearchCache()
+    cache.invalidate(1)
+    cache.set('a', 1, version=1)
+    cache.invalidate(2)
+    assert cache.get('a') is None
+    cache.set('a', 1, version=1)  # 古いバージョンで作った結果は保存しない
+    assert cache.get('a') is None
+    assert cache.stats()['version'] == 2
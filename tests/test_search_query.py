@@ -0,0 +1,142 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from utilities.search_query import (
+    build_count_query, build_facet_counts_query, build_query_with_filters, build_search_query,
+    collect_facet_counts, decode_cursor, encode_cursor,
+    next_cursor, parse_range_filters, split_total,
+)
+
+def test_build_query_with_filters():
+    query, params = build_query_with_filters(" WHERE 1=1", {'type_filter': 'パス', 'level_filter': ''}, [])
+    assert query == " WHERE 1=1 AND cat.category_title = %s"
+    assert params == ['パス']
+
+def test_build_search_query_joins_category():
+    filters = {'type_filter': '対人', 'players_filter': '2対1', 'channel_filter': 3}
+    query, params = build_search_query('ドリブル', filters, 'view_count', 10, 20)
+    assert 'JOIN category cat ON cat.ID = c.ID' in query
+    assert ' IN (' not in query
+    assert query.endswith('ORDER BY COALESCE(c.view_count, -1) DESC, c.ID DESC LIMIT %s OFFSET %s')
+    assert params == ['対人', '2対1', 3, '%ドリブル%', 10, 20]
+
+def test_build_count_query():
+    query, params = build_count_query('', {})
+    assert query.startswith('SELECT count(*)')
+    assert 'ILIKE' not in query
+    assert params == []
+
+def test_build_search_query_window_total():
+    query, _ = build_search_query('パス', {}, 'upload_date', 10, 0)
+    assert 'count(*) OVER () AS total' in query
+
+def test_build_search_query_estimated_total_only_for_broad_queries():
+    query, _ = build_search_query('', {}, 'upload_date', 10, 0, 'estimate')
+    assert 'pg_class' in query
+    query, _ = build_search_query('', {'level_filter': '中学生'}, 'upload_date', 10, 0, 'estimate')
+    assert 'count(*) OVER () AS total' in query
+
+def test_build_search_query_separate_total_has_no_window():
+    query, params = build_search_query('', {'level_filter': '中学生'}, 'view_count', 10, 0, 'separate')
+    assert 'OVER ()' not in query
+    assert 'pg_class' not in query
+    assert query.startswith('SELECT c.ID, c.title') and 'c.popularity FROM' in ' '.join(query.split())
+    assert params == ['中学生', 10, 0]
+
+def test_split_total():
+    assert split_total([]) == ([], None)
+    assert split_total([('a', 'x', 3), ('b', 'y', 3)]) == ([('a', 'x'), ('b', 'y')], 3)
+
+def test_build_search_query_joins_channel_name():
+    query, _ = build_search_query('', {}, 'upload_date', 10, 0)
+    assert 'LEFT JOIN cid ch ON ch.id = c.channel_category' in query
+    assert 'ch.cname, c.published_at, c.popularity, count(*) OVER ()' in query
+
+def test_build_search_query_with_cursor_seeks_instead_of_offset():
+    query, params = build_search_query('', {}, 'view_count', 10, 40, cursor=(120, 'abc'))
+    assert '(COALESCE(c.view_count, -1), c.ID) < (%s, %s)' in query
+    assert params == [120, 'abc', 10, 0]
+
+def test_cursor_round_trip():
+    published_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    cursor = encode_cursor('upload_date', published_at, 'abc')
+    assert decode_cursor(cursor, 'upload_date') == (published_at, 'abc')
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 'view_count')
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor', 'upload_date')
+
+def test_decode_cursor_rejects_wrong_value_types():
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor('upload_date', 5, 'x'), 'upload_date')
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor('upload_date', '2024-01-01T00:00:00', 'x'), 'upload_date')  # タイムゾーンなし
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor('view_count', '120', 'x'), 'view_count')
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor('view_count', True, 'x'), 'view_count')
+    assert decode_cursor(encode_cursor('popular', 1.5, 'x'), 'popular') == (1.5, 'x')
+
+def test_next_cursor():
+    rows = [('a', 't', '2024', 'u', 30, 1, '0:01:00', 'ch', None, 0.0), ('b', 't', '2023', 'u', 20, None, '0:01:00', 'ch', None, 0.0)]
+    assert decode_cursor(next_cursor(rows, 'view_count', 2), 'view_count') == (20, 'b')
+    assert next_cursor(rows, 'view_count', 3) is None  # 最終ページ
+    assert next_cursor(rows, 'like_count', 2) is None  # NULL は OFFSET に任せる
+    assert next_cursor([], 'view_count', 0) is None  # limit=0 の空のページ
+
+def test_build_search_query_with_candidate_ids():
+    query, params = build_search_query('ドリブル', {}, 'upload_date', 10, 0, ids={'v1'})
+    assert 'c.ID = ANY(%s)' in query
+    assert 'ILIKE' not in query
+    assert params == [['v1'], 10, 0]
+
+def test_build_facet_counts_query_excludes_own_filter():
+    filters = {'type_filter': 'パス', 'level_filter': '中学生'}
+    query, params = build_facet_counts_query('', filters)
+    parts = query.split(' UNION ALL ')
+    assert len(parts) == 4
+    assert "'category_title' AS facet" in parts[0]
+    assert 'cat.category_title = %s' not in parts[0]
+    assert 'cat.level = %s' in parts[0]
+    assert params == ['中学生', 'パス', '中学生', 'パス', 'パス', '中学生']
+
+def test_collect_facet_counts():
+    rows = [('category_title', 'パス', 3), ('level', None, 1), ('channel', '2', 5)]
+    assert collect_facet_counts(rows) == {
+        'category_title': {'パス': 3}, 'players': {}, 'level': {}, 'channel': {'2': 5},
+    }
+
+def test_upload_date_sorts_by_published_at():
+    query, params = build_search_query('', {}, 'upload_date', 10, 0, cursor=(datetime(2024, 1, 1), 'abc'))
+    # 日付を読み取れなかった動画（published_at が NULL）は最後に並べる
+    expression = "COALESCE(c.published_at, '-infinity'::timestamptz)"
+    assert f'({expression}, c.ID) < (%s, %s)' in query
+    assert query.endswith(f'ORDER BY {expression} DESC, c.ID DESC LIMIT %s OFFSET %s')
+
+def test_parse_range_filters():
+    filters = parse_range_filters({'max_duration': '300', 'uploaded_after': '2024-01-01', 'min_duration': ''})
+    assert filters == {
+        'max_duration': 300,
+        'uploaded_after': datetime(2024, 1, 1, tzinfo=timezone(timedelta(hours=9))),
+    }
+    with pytest.raises(ValueError):
+        parse_range_filters({'min_duration': 'five'})
+    with pytest.raises(ValueError):
+        parse_range_filters({'uploaded_before': 'last year'})
+
+def test_build_query_with_range_filters():
+    after = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    query, params = build_query_with_filters(" WHERE 1=1", {'max_duration': 300, 'uploaded_after': after}, [])
+    assert query == " WHERE 1=1 AND c.duration_seconds <= %s AND c.published_at >= %s"
+    assert params == [300, after]
+
+def test_sort_keys_are_whitelisted():
+    query, _ = build_search_query('', {}, 'popular', 10, 0)
+    assert query.endswith('ORDER BY c.popularity DESC, c.ID DESC LIMIT %s OFFSET %s')
+    with pytest.raises(ValueError):
+        build_search_query('', {}, 'title; DROP TABLE contents', 10, 0)
+
+def test_search_query_text_is_shared_per_shape():
+    first, first_params = build_search_query('パス', {'type_filter': 'A', 'min_duration': 60}, 'popular', 10, 0)
+    second, second_params = build_search_query('シュート', {'type_filter': 'B', 'min_duration': 120}, 'popular', 20, 40)
+    assert first is second  # 形が同じならクエリの文字列を作り直さない
+    assert first_params != second_params
@@ -0,0 +1,30 @@
+from utilities.title_index import TitleIndex, normalize_title
+
+def make_index():
+    return TitleIndex.build([
+        ('v1', '【小学生】ドリブル練習メニュー'),
+        ('v2', '２対１のパス練習'),
+        ('v3', 'GKトレーニング'),
+    ])
+
+def test_normalize_title():
+    assert normalize_title('ＧＫ２対１') == 'gk2対1'
+
+def test_search_substring():
+    index = make_index()
+    assert index.search('ドリブル') == {'v1'}
+    assert index.search('練習') == {'v1', 'v2'}
+    assert index.search('2対1') == {'v2'}  # 全角・半角の違いは NFKC で吸収
+    assert index.search('gk') == {'v3'}
+
+def test_search_single_character_and_no_match():
+    index = make_index()
+    assert index.search('パ') == {'v2'}
+    assert index.search('練メ') == set()  # バイグラムが揃っても連続していなければ一致しない
+
+def test_add_replaces_title():
+    index = make_index()
+    index.add('v3', 'キーパー練習')
+    assert index.search('gk') == set()
+    assert index.search('練習') == {'v1', 'v2', 'v3'}
+    assert len(index) == 3
@@ -0,0 +1,113 @@
+import os
+import pytest
+import psycopg2
+
+# ローカルの PostgreSQL（pg_trgm が使えるもの）がある場合のみ実行する
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+
+@pytest.fixture
+def conn():
+    os.environ.setdefault('DATABASE_URL', TEST_DATABASE_URL)
+    conn = psycopg2.connect(TEST_DATABASE_URL)
+    yield conn
+    conn.rollback()  # 一時テーブルごと破棄する
+    conn.close()
+
+
+def explain(c, query, params):
+    c.execute("EXPLAIN " + query, params)
+    return "\n".join(row[0] for row in c.fetchall())
+
+
+def create_search_tables(c):
+    # 同じ名前の一時テーブルが優先されるので本番の contents には触れない
+    c.execute('''
+        CREATE TEMP TABLE contents (
+            ID TEXT PRIMARY KEY, title TEXT, upload_date TEXT, video_url TEXT,
+            view_count INTEGER, like_count INTEGER, duration TEXT, channel_category INTEGER,
+            published_at TIMESTAMPTZ, duration_seconds INTEGER, upload_date_display TEXT, embed_url TEXT,
+            popularity DOUBLE PRECISION NOT NULL DEFAULT 0
+        )
+    ''')
+    c.execute("CREATE TEMP TABLE category (ID TEXT PRIMARY KEY, category_title TEXT, players TEXT, level TEXT, channel_brand_category INTEGER)")
+    c.execute("CREATE TEMP TABLE cid (id SERIAL PRIMARY KEY, cid TEXT, cname TEXT, clink TEXT)")
+
+
+def test_title_ilike_uses_trigram_index(conn):
+    from utilities.db_access import TITLE_SEARCH_INDEX_QUERY
+    from utilities.search_query import build_search_query
+
+    with conn.cursor() as c:
+        create_search_tables(c)
+        c.execute('''
+            INSERT INTO contents (ID, title, upload_date, view_count)
+            SELECT 'v' || i, md5(i::text) || CASE WHEN i % 500 = 0 THEN 'ドリブル練習' ELSE 'パス' END,
+                   '2024-01-01T00:00:00Z', i
+            FROM generate_series(1, 20000) AS i
+        ''')
+        c.execute("INSERT INTO category (ID) SELECT ID FROM contents")
+        c.execute(TITLE_SEARCH_INDEX_QUERY)
+        c.execute("ANALYZE contents")
+
+        query, params = build_search_query('ドリブル練習', {}, 'view_count', 10, 0)
+        plan = explain(c, "SELECT ID FROM contents c WHERE c.title ILIKE %s", (params[0],))
+        assert 'contents_title_trgm_idx' in plan
+        assert 'Seq Scan' not in plan
+
+        # 検索クエリ全体でもインデックスから絞り込めること（シーケンシャルスキャンは最後の手段にする）
+        c.execute("SET LOCAL enable_seqscan = off")
+        assert 'contents_title_trgm_idx' in explain(c, query, params)
+
+
+def test_sorted_page_reads_top_rows_from_sort_index(conn):
+    from utilities.db_access import SORT_INDEX_QUERY
+    from utilities.search_query import build_search_query
+
+    with conn.cursor() as c:
+        create_search_tables(c)
+        c.execute('''
+            INSERT INTO contents (ID, title, upload_date, view_count)
+            SELECT 'v' || i, 'パス', '2024-01-01T00:00:00Z', i FROM generate_series(1, 20000) AS i
+        ''')
+        c.execute("INSERT INTO category (ID) SELECT ID FROM contents")
+        c.execute(SORT_INDEX_QUERY)
+        c.execute("ANALYZE contents")
+        c.execute("ANALYZE category")
+
+        # 総件数を別に数える場合は並び替えのインデックスを上から LIMIT 件だけ読む（Sort・WindowAgg なし）
+        for cursor in (None, (10000, 'v10000')):
+            query, params = build_search_query('', {}, 'view_count', 10, 0, 'separate', cursor)
+            plan = explain(c, query, params)
+            assert plan.startswith('Limit')
+            assert 'contents_view_count_sort_idx' in plan
+            assert 'Sort' not in plan and 'WindowAgg' not in plan
+
+        # window 関数で総件数を数える場合は LIMIT の前に一致する全行を読む
+        query, params = build_search_query('', {}, 'view_count', 10, 0, 'exact')
+        assert 'WindowAgg' in explain(c, query, params)
+
+
+def test_undated_videos_sort_last_and_follow_the_last_cursor(conn):
+    from utilities.db_access import SORT_INDEX_QUERY
+    from utilities.search_query import build_search_query, next_cursor, decode_cursor
+
+    with conn.cursor() as c:
+        create_search_tables(c)
+        c.execute('''
+            INSERT INTO contents (ID, title, published_at) VALUES
+                ('v1', 'a', '2024-01-01T00:00:00Z'), ('v2', 'b', '2024-02-01T00:00:00Z'), ('v3', 'c', NULL)
+        ''')
+        c.execute("INSERT INTO category (ID) SELECT ID FROM contents")
+        c.execute(SORT_INDEX_QUERY)
+
+        query, params = build_search_query('', {}, 'upload_date', 2, 0, 'separate')
+        c.execute(query, params)
+        rows = c.fetchall()
+        assert [r[0] for r in rows] == ['v2', 'v1']  # published_at が NULL の動画は最後
+
+        cursor = decode_cursor(next_cursor(rows, 'upload_date', 2), 'upload_date')
+        query, params = build_search_query('', {}, 'upload_date', 2, 0, 'separate', cursor)
+        c.execute(query, params)
+        assert [r[0] for r in c.fetchall()] == ['v3']
@@ -0,0 +1,158 @@
+import json
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+from utilities import get_channel_id, get_videos, http_client
+from utilities.get_channel_id import get_channels_details
+from utilities.get_videos import iter_uploads_video_data
+from utilities.ingest_pipeline import classify, stream_concurrently, write_streams
+from utilities.rate_limit import TokenBucket
+
+# ローカルの YouTube Data API のスタブ（channels / playlistItems / videos のみ）
+PLAYLIST = [
+    ('v4', '2024-04-01T00:00:00Z'),
+    ('v3', '2024-03-01T00:00:00Z'),
+    ('private', None),  # 非公開の動画は videoPublishedAt がない
+    ('v2', '2024-02-01T00:00:00Z'),
+    ('v1', '2024-01-01T00:00:00Z'),
+]
+PAGE_SIZE = 2
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    requests_seen = []
+    fail_page_token = None  # このページトークンの playlistItems は 403 を返す
+    fail_videos = False  # videos は 403 を返す
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.requests_seen.append((url.path, params))
+
+        if url.path == '/playlistItems' and self.fail_page_token and params.get('pageToken') == self.fail_page_token:
+            self.send_error(403)
+            return
+        if url.path == '/videos' and self.fail_videos:
+            self.send_error(403)
+            return
+        if url.path == '/channels':
+            body = {'items': [
+                {'id': channel_id, 'brandingSettings': {'channel': {'title': f'name {channel_id}'}},
+                 'contentDetails': {'relatedPlaylists': {'uploads': 'UU' + channel_id}}}
+                for channel_id in params['id'].split(',')
+            ]}
+        elif url.path == '/playlistItems':
+            start = int(params.get('pageToken', 0))
+            items = [
+                {'snippet': {'title': f'title {video_id}', 'publishedAt': '2025-01-01T00:00:00Z'},
+                 'contentDetails': dict({'videoId': video_id}, **({'videoPublishedAt': published} if published else {}))}
+                for video_id, published in PLAYLIST[start:start + PAGE_SIZE]
+            ]
+            body = {'items': items}
+            if start + PAGE_SIZE < len(PLAYLIST):
+                body['nextPageToken'] = str(start + PAGE_SIZE)
+        elif url.path == '/videos':
+            body = {'items': [
+                {'id': video_id, 'statistics': {'viewCount': '10', 'likeCount': '1'}, 'contentDetails': {'duration': 'PT5M'}}
+                for video_id in params['id'].split(',')
+            ]}
+        else:
+            self.send_error(404)
+            return
+
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_api(monkeypatch):
+    server = HTTPServer(('127.0.0.1', 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    StubHandler.requests_seen = []
+    StubHandler.fail_page_token = None
+    StubHandler.fail_videos = False
+    monkeypatch.setattr(get_videos, 'YOUTUBE_API_BASE', f'http://127.0.0.1:{server.server_port}')
+    monkeypatch.setattr(get_channel_id, 'YOUTUBE_API_BASE', f'http://127.0.0.1:{server.server_port}')
+    monkeypatch.setattr(get_videos, '_uploads_playlists', {})
+    monkeypatch.setattr(http_client, 'rate_limiter', TokenBucket(0))  # スタブなので待たない
+    yield StubHandler.requests_seen
+    server.shutdown()
+    server.server_close()
+
+
+def crawl_uploads(channel_id, published_after=None):
+    return [data for page in iter_uploads_video_data(channel_id, 'key', published_after) for data in page]
+
+
+def test_uploads_crawler_pages_playlist_items(stub_api):
+    video_data = crawl_uploads('CH1')
+    assert [data['id'] for data in video_data] == ['v4', 'v3', 'v2', 'v1']
+    assert video_data[0]['upload_date'] == '2024-04-01T00:00:00Z'  # 再生リストへの追加日ではなく公開日
+    assert video_data[0]['duration'] == '0:05:00'
+    assert video_data[0]['view_count'] == '10'
+
+    paths = [path for path, _ in stub_api]
+    assert paths.count('/channels') == 1
+    assert paths.count('/playlistItems') == 3
+    assert '/search' not in paths
+    assert stub_api[1][1]['playlistId'] == 'UUCH1'
+
+    # 再生リストIDは1チャンネルにつき1回だけ問い合わせる
+    crawl_uploads('CH1')
+    assert [path for path, _ in stub_api].count('/channels') == 1
+
+
+def test_channel_details_provide_uploads_playlists(stub_api):
+    names = get_channels_details(['CH1', 'CH2'], 'key')
+    assert names == {'CH1': 'name CH1', 'CH2': 'name CH2'}
+    assert stub_api[0][1]['part'] == 'brandingSettings,contentDetails'
+
+    # チャンネル名と一緒に取得した再生リストIDを使うので、チャンネルごとの channels API は呼ばない
+    assert [data['id'] for data in crawl_uploads('CH2')] == ['v4', 'v3', 'v2', 'v1']
+    paths = [path for path, _ in stub_api]
+    assert paths.count('/channels') == 1
+    assert stub_api[1][1]['playlistId'] == 'UUCH2'
+
+
+def test_uploads_crawler_stops_at_watermark(stub_api):
+    watermark = datetime(2024, 2, 1, tzinfo=timezone.utc)
+    video_data = crawl_uploads('CH1', published_after=watermark)
+    assert [data['id'] for data in video_data] == ['v4', 'v3']
+    assert [path for path, _ in stub_api].count('/playlistItems') == 2
+
+
+def test_failed_page_keeps_watermark(stub_api):
+    StubHandler.fail_page_token = '2'  # 1ページ目は取得でき、2ページ目で失敗する
+    watermark = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    written, updated = [], []
+
+    def write(key, video_data, contents_data):
+        written.extend(data['id'] for data in video_data)
+        return True
+
+    def produce(channel_id, published_after):
+        return classify(iter_uploads_video_data(channel_id, 'key', published_after))
+
+    events = stream_concurrently([('CH1', ('CH1', watermark))], produce)
+    failed = write_streams(events, write, {'CH1': watermark}, lambda key, latest: updated.append((key, latest)))
+    assert written == ['v4', 'v3']  # 取得できたページは書き込む
+    assert failed == {'CH1'}
+    assert updated == []  # 残りのページを次回取得できるようにウォーターマークは進めない
+
+
+def test_failed_video_details_end_the_crawl_with_an_error(stub_api):
+    StubHandler.fail_videos = True
+    with pytest.raises(requests.exceptions.RequestException):
+        crawl_uploads('CH1')
@@ -0,0 +1,194 @@
+import logging
+from contextlib import closing
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from psycopg2.extras import execute_values
+
+from utilities.content_fields import derived_content_fields
+from utilities.popularity import compute_popularity
+
+
+# ロガーの設定
+logging.basicConfig(
+    level=logging.INFO,  # ログレベルを INFO に設定
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # 標準出力にログを表示
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+# 1回の execute_values・マージで書き込む行数
+BATCH_SIZE = 1000
+
+CONTENTS_COLUMNS: Tuple[str, ...] = (
+    "id", "title", "upload_date", "video_url", "view_count", "like_count", "duration", "channel_category",
+    "published_at", "duration_seconds", "upload_date_display", "embed_url", "popularity",
+)
+
+CATEGORY_COLUMNS: Tuple[str, ...] = ("id", "category_title", "players", "level", "channel_brand_category")
+
+# 再生回数・いいね数の更新で書き込むカラム（変わったかどうかは件数だけで判断する）
+STATS_COLUMNS: Tuple[str, ...] = ("id", "view_count", "like_count", "popularity")
+STATS_COMPARE_COLUMNS: Tuple[str, ...] = ("view_count", "like_count")
+
+
+def batched(rows: Iterable, size: int) -> Iterator[List]:
+    """rows を size 行ずつのリストに分ける"""
+    iterator = iter(rows)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def to_count(value, video_id: str = None, name: str = "like_count") -> Optional[int]:
+    """API の件数（'N/A' や文字列のことがある）を整数に変換（変換できなければ None）"""
+    if value in ('N/A', None):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        logger.warning("Invalid %s value for ID %s: %s", name, video_id, value)
+        return None
+
+
+def contents_rows(video_data: Sequence[Dict], channel_category) -> List[Tuple]:
+    """iter_youtube_video_data などが返す動画データを CONTENTS_COLUMNS の並びの行に変換する
+
+    日時・動画時間の型変換と表示用の値、人気スコア（バッチ全体でまとめて計算）もここで済ませる。
+    """
+    fields_list = [derived_content_fields(data['upload_date'], data['duration'], data['url']) for data in video_data]
+    scores = compute_popularity(
+        [data.get('view_count') for data in video_data],
+        [data.get('like_count') for data in video_data],
+        [fields['published_at'] for fields in fields_list],
+    )
+    return [
+        (
+            data['id'], data['title'], data['upload_date'], data['url'],
+            to_count(data.get('view_count'), data['id'], 'view_count'), to_count(data.get('like_count'), data['id']),
+            data['duration'], channel_category,
+            fields['published_at'], fields['duration_seconds'],
+            fields['upload_date_display'], fields['embed_url'], popularity,
+        )
+        for data, fields, popularity in zip(video_data, fields_list, scores)
+    ]
+
+
+def category_rows(contents_data: Iterable[Dict], channel_category) -> List[Tuple]:
+    """update_category の結果を CATEGORY_COLUMNS の並びの行に変換する"""
+    return [
+        (data["id"], data["category"], data["nop"], data["level"], channel_category)
+        for data in contents_data
+    ]
+
+
+def stats_rows(published_at: Dict[str, object], details: Iterable[Dict]) -> List[Tuple]:
+    """videos API の statistics を STATS_COLUMNS の並びの行に変換する（人気スコアも計算し直す）
+
+    published_at は動画ID → 公開日時。API から返らなかった動画（削除・非公開）は含めない。
+    """
+    details = [detail for detail in details if detail.get('id') in published_at and 'statistics' in detail]
+    view_counts = [to_count(d['statistics'].get('viewCount'), d['id'], 'view_count') for d in details]
+    like_counts = [to_count(d['statistics'].get('likeCount'), d['id']) for d in details]
+    scores = compute_popularity(view_counts, like_counts, [published_at[d['id']] for d in details])
+    return [
+        (detail['id'], view_count, like_count, popularity)
+        for detail, view_count, like_count, popularity in zip(details, view_counts, like_counts, scores)
+    ]
+
+
+def staging_table_query(table: str) -> str:
+    """書き込み先と同じ形の一時テーブル（コミットごとに空になる）を作るクエリ"""
+    return (f"CREATE TEMP TABLE IF NOT EXISTS {table}_staging "
+            f"(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS")
+
+
+def merge_query(table: str, columns: Sequence[str], key: str = "id", update_columns: Sequence[str] = ()) -> str:
+    """一時テーブルの行を本テーブルに1回の INSERT ... ON CONFLICT でまとめて反映するクエリ
+
+    update_columns を指定した場合は、既存の行のうち値が変わったものだけ更新する。
+    同じキーが一時テーブルに複数ある場合は1行にまとめる。
+    """
+    column_list = ", ".join(columns)
+    query = (f"INSERT INTO {table} ({column_list}) "
+             f"SELECT DISTINCT ON ({key}) {column_list} FROM {table}_staging ORDER BY {key} "
+             f"ON CONFLICT ({key}) ")
+    if not update_columns:
+        return query + "DO NOTHING"
+    assignments = ", ".join(f"{column} = EXCLUDED.{column}" for column in update_columns)
+    current = ", ".join(f"{table}.{column}" for column in update_columns)
+    incoming = ", ".join(f"EXCLUDED.{column}" for column in update_columns)
+    return query + f"DO UPDATE SET {assignments} WHERE ({current}) IS DISTINCT FROM ({incoming})"
+
+
+def update_query(table: str, columns: Sequence[str], key: str = "id",
+                 compare_columns: Optional[Sequence[str]] = None) -> str:
+    """一時テーブルの値で既存の行だけを1回の UPDATE ... FROM でまとめて更新するクエリ
+
+    compare_columns（省略時は key 以外の全カラム）の値が変わった行だけを更新し、
+    本テーブルにない行は追加しない。
+    """
+    update_columns = [column for column in columns if column != key]
+    compare_columns = compare_columns or update_columns
+    assignments = ", ".join(f"{column} = s.{column}" for column in update_columns)
+    current = ", ".join(f"{table}.{column}" for column in compare_columns)
+    incoming = ", ".join(f"s.{column}" for column in compare_columns)
+    return (f"UPDATE {table} SET {assignments} "
+            f"FROM (SELECT DISTINCT ON ({key}) * FROM {table}_staging ORDER BY {key}) AS s "
+            f"WHERE {table}.{key} = s.{key} AND ({current}) IS DISTINCT FROM ({incoming})")
+
+
+def write_batches(conn, table: str, columns: Sequence[str], rows: Iterable[Tuple], statement: str,
+                  batch_size: int = BATCH_SIZE, commit: bool = True) -> int:
+    """rows を batch_size 行ずつ一時テーブルに execute_values で流し込み、バッチごとに statement を1回実行してコミットする
+
+    statement が書き込んだ行数の合計を返す。エラーの場合はそのバッチをロールバックして例外を送出する。
+    commit=False の場合はコミットせず、呼び出し元のトランザクションにまとめる。
+    """
+    written = 0
+    with closing(conn.cursor()) as c:
+        for batch in batched(rows, batch_size):
+            try:
+                c.execute(staging_table_query(table))
+                execute_values(c, f"INSERT INTO {table}_staging ({', '.join(columns)}) VALUES %s",
+                               batch, page_size=len(batch))
+                c.execute(statement)
+                written += c.rowcount
+                if commit:
+                    conn.commit()  # バッチごとに1回だけコミット（一時テーブルも空になる）
+                else:
+                    c.execute(f"TRUNCATE {table}_staging")
+            except Exception:
+                conn.rollback()
+                raise
+            logger.info("Merged %d rows into '%s' (%d written so far).", len(batch), table, written)
+    return written
+
+
+def bulk_upsert(conn, table: str, columns: Sequence[str], rows: Iterable[Tuple], key: str = "id",
+                update_columns: Sequence[str] = (), batch_size: int = BATCH_SIZE, commit: bool = True) -> int:
+    """rows をバッチごとに1回の INSERT ... ON CONFLICT でまとめて書き込む（追加・更新した行数を返す）"""
+    return write_batches(conn, table, columns, rows, merge_query(table, columns, key, update_columns), batch_size,
+                         commit)
+
+
+def write_tables(conn, writes: Sequence[Tuple[str, Sequence[str], Iterable[Tuple]]]) -> List[int]:
+    """(テーブル, カラム, 行) ごとに bulk_upsert し、すべてを1つのトランザクションでコミットする
+
+    テーブルごとの書き込み行数を返す。どれかが失敗した場合はすべてロールバックして例外を送出する。
+    """
+    try:
+        written = [bulk_upsert(conn, table, columns, rows, commit=False) for table, columns, rows in writes]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return written
+
+
+def bulk_update(conn, table: str, columns: Sequence[str], rows: Iterable[Tuple], key: str = "id",
+                compare_columns: Optional[Sequence[str]] = None, batch_size: int = BATCH_SIZE) -> int:
+    """既存の行のうち値が変わったものだけをバッチごとに1回の UPDATE でまとめて更新する（更新した行数を返す）"""
+    return write_batches(conn, table, columns, rows, update_query(table, columns, key, compare_columns), batch_size)
@@ -0,0 +1,56 @@
+import threading
+import time
+import logging
+from typing import Callable, List, Optional
+
+
+# ロガーの設定
+logging.basicConfig(
+    level=logging.INFO,  # ログレベルを INFO に設定
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # 標準出力にログを表示
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+class CatalogWatcher:
+    """カタログのバージョンを一定間隔で確認し、変わっていれば登録された処理を呼び出す"""
+
+    def __init__(self, load_version: Callable[[], Optional[int]], poll_interval: float = 30.0):
+        self._load_version = load_version
+        self._poll_interval = poll_interval
+        self._callbacks: List[Callable[[int], None]] = []
+        self._lock = threading.Lock()
+        self._last_check = None
+        self.version: Optional[int] = None
+
+    def subscribe(self, callback: Callable[[int], None]):
+        """バージョンが変わったときに呼び出す処理を登録（登録した順に呼び出す）"""
+        self._callbacks.append(callback)
+
+    def check(self, force: bool = False) -> Optional[int]:
+        """前回の確認から poll_interval 秒以上経っていればバージョンを確認する"""
+        now = time.monotonic()
+        if not force and self._last_check is not None and now - self._last_check < self._poll_interval:
+            return self.version
+
+        with self._lock:
+            if not force and self._last_check is not None and now - self._last_check < self._poll_interval:
+                return self.version
+            self._last_check = now
+
+            version = self._load_version()
+            if version is None or version == self.version:
+                return self.version
+
+            logger.info("Catalog version changed: %s -> %s", self.version, version)
+            for callback in self._callbacks:
+                try:
+                    callback(version)
+                except Exception as e:
+                    logger.error("Error while refreshing catalog data: %s", e)
+            # 読み込み中のリクエストには古いバージョンを返し、すべて反映してから新しいバージョンにする
+            self.version = version
+            return version
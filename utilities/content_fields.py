@@ -0,0 +1,69 @@
+import re
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+
+# ロガーの設定
+logging.basicConfig(
+    level=logging.INFO,  # ログレベルを INFO に設定
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # 標準出力にログを表示
+    ]
+)
+logger = logging.getLogger(__name__)
+
+JST = timezone(timedelta(hours=9))
+
+DISPLAY_DATE_FORMAT = "%Y年%m月%d日%H時%M分"
+
+
+def parse_upload_date(upload_date: str) -> Tuple[Optional[datetime], Optional[str]]:
+    """アップロード日の文字列を (timestamptz 用の日時, 表示用の文字列) に変換
+
+    API の ISO 形式 (UTC) と日本語形式（日本時間とみなす）に対応し、表示は元の時刻のまま行う。
+    """
+    dt = (upload_date or "").rstrip("Z")
+    try:
+        # API の形式（例: "2023-11-22T02:00:00Z"）
+        date_obj = datetime.strptime(dt, "%Y-%m-%dT%H:%M:%S")
+        tz = timezone.utc
+    except ValueError:
+        try:
+            # 日本語形式（例: "2023年11月22日11時00分"）の場合
+            date_obj = datetime.strptime(dt, DISPLAY_DATE_FORMAT)
+            tz = JST
+        except ValueError:
+            logger.error(f"Unsupported date format: {dt}")
+            return None, None
+
+    return date_obj.replace(tzinfo=tz), date_obj.strftime(DISPLAY_DATE_FORMAT)
+
+
+def duration_to_seconds(duration: str) -> Optional[int]:
+    """convert_duration の形式（例: "0:15:00", "1 day, 2:00:00"）を秒数に変換"""
+    match = re.fullmatch(r"(?:(\d+) days?, )?(\d+):(\d{2}):(\d{2})", (duration or "").strip())
+    if not match:
+        return None
+    days, hours, minutes, seconds = (int(v or 0) for v in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def convert_to_embed_url(video_url: str) -> str:
+    """YouTubeの通常リンクからVIDEO_IDを抽出し、埋め込みリンクを生成する"""
+    if video_url and "watch?v=" in video_url:
+        video_id = video_url.split("watch?v=")[-1]
+        return f"https://www.youtube.com/embed/{video_id}"
+    return video_url  # 他のリンク形式の場合そのまま返す
+
+
+def derived_content_fields(upload_date: str, duration: str, video_url: str) -> Dict:
+    """書き込み時に計算しておく型付きカラムと表示用カラムの値"""
+    published_at, upload_date_display = parse_upload_date(upload_date)
+    return {
+        "published_at": published_at,
+        "upload_date_display": upload_date_display,
+        "duration_seconds": duration_to_seconds(duration),
+        "embed_url": convert_to_embed_url(video_url),
+    }
@@ -1,9 +1,10 @@
 from contextlib import closing
 from collections import defaultdict
 from dotenv import load_dotenv
-from flask import g
-from psycopg2.pool import SimpleConnectionPool
+from flask import g, has_request_context, request
+from psycopg2.extras import execute_values
 from contextlib import contextmanager
+from datetime import datetime, timezone
 
 
 import sqlite3
@@ -12,6 +13,15 @@ import logging
 import pandas as pd
 import os
 
+from utilities.bulk_write import (
+    CATEGORY_COLUMNS, CONTENTS_COLUMNS, STATS_COLUMNS, STATS_COMPARE_COLUMNS, bulk_update, bulk_upsert, category_rows,
+    contents_rows, write_tables,
+)
+from utilities.content_fields import derived_content_fields
+from utilities.db_pool import InstrumentedPool, ReadRouter
+from utilities.popularity import POPULARITY_EPSILON, POPULARITY_SQL
+from utilities.search_query import SORT_KEYS, build_index_rows_query, sort_expression
+
 # データベースに接続し、コンテキストマネージャを使って自動で接続を閉じる
 #DATABASE_PATH = './soccer_content.db'
 #file_path = "../misc/youtube_video_data.csv"
@@ -33,6 +43,8 @@ load_dotenv()
 
 
 DATABASE_URL = os.getenv('DATABASE_URL')
+# 検索などの読み取り専用のリクエストに使うレプリカ（カンマ区切り、未設定ならプライマリのみ）
+READ_REPLICA_URLS = [url.strip() for url in os.getenv('READ_REPLICA_URLS', '').split(',') if url.strip()]
 
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL is not set!")
@@ -50,20 +62,76 @@ logger = logging.getLogger(__name__)
 
 #pool = SimpleConnectionPool(1, 10, **DATABASE_CONFIG)  # 最小1、最大10の接続プール
 
-pool = SimpleConnectionPool(1, 10, dsn=DATABASE_URL)  # 最小1、最大10の接続プール
+# スレッドセーフな接続プール（最小1、最大 DB_POOL_MAX の接続）
+# DB_LEAK_SECONDS を超えて返却されない接続はログに出す
+pool = InstrumentedPool(
+    1, int(os.getenv('DB_POOL_MAX', 10)), dsn=DATABASE_URL,
+    checkout_timeout=float(os.getenv('DB_CHECKOUT_TIMEOUT', 30)),
+    leak_seconds=float(os.getenv('DB_LEAK_SECONDS', 30)),
+)
+pool.start_leak_detector()
+
+# 読み取り用のレプリカのプール（起動時にレプリカが落ちていても良いように最小0）
+# レプリカが満杯のときはすぐプライマリに切り替えるため、待ち時間は短くする
+replica_pools = [
+    InstrumentedPool(
+        0, int(os.getenv('DB_REPLICA_POOL_MAX', 10)), dsn=url,
+        checkout_timeout=float(os.getenv('DB_REPLICA_CHECKOUT_TIMEOUT', 1)),
+        leak_seconds=float(os.getenv('DB_LEAK_SECONDS', 30)),
+    )
+    for url in READ_REPLICA_URLS
+]
+for replica_pool in replica_pools:
+    replica_pool.start_leak_detector()
+read_router = ReadRouter(pool, replica_pools, retry_seconds=float(os.getenv('DB_REPLICA_RETRY_SECONDS', 30)))
 
 
 def get_db_connection():
-    """リクエストごとに同じ接続を再利用する"""
+    """リクエストごとに同じ接続を再利用する（返却は app.py の close_db で行う）"""
     if "db" not in g or g.db.closed:
         if "db" in g:
             logger.warning("Stale database connection found. Reacquiring...")
             pool.putconn(g.pop("db"))  # 古い接続をプールに返却
-        g.db = pool.getconn()
+        g.db = pool.getconn(owner=request.path if has_request_context() else None)
         logger.info("New database connection acquired")
     return g.db
 
 
+def get_read_connection():
+    """読み取り専用の接続をリクエストごとに再利用する（レプリカ優先、返却は app.py の close_db で行う）"""
+    if "read_db" not in g or g.read_db.closed:
+        if "read_db" in g:
+            logger.warning("Stale read connection found. Reacquiring...")
+            read_router.putconn(g.pop("read_db"))
+        g.read_db = read_router.getconn(owner=request.path if has_request_context() else None)
+    return g.read_db
+
+
+def run_read_query(func):
+    """読み取り用の接続で func(conn) を実行する
+
+    レプリカが接続エラーになった場合はその接続を破棄し、プライマリで1回だけやり直す。
+    """
+    conn = get_read_connection()
+    try:
+        return func(conn)
+    except psycopg2.OperationalError as e:
+        g.pop("read_db", None)
+        g.read_db = read_router.failover(conn, e, owner=request.path if has_request_context() else None)
+        return func(g.read_db)
+
+
+def release_read_connection():
+    """リクエストで使った読み取り用の接続を返却する"""
+    if "read_db" in g:
+        read_router.putconn(g.pop("read_db"))
+
+
+def get_pool_stats():
+    """接続プールの使用状況（貸し出し中・待機中の接続数、待ち時間、レプリカごとの状況）"""
+    return dict(pool.stats(), **read_router.stats())
+
+
 
 @contextmanager
 def use_db_connection():
@@ -86,27 +154,27 @@ def use_db_connection():
 def delete_table(tbl_name: str):
     """テーブルを削除して、データを削除"""
     logger.info(f"Deleting data and dropping {tbl_name} table if it exists...")
-    with closing(get_db_connection()) as conn:
-        c = conn.cursor()
-        try:
-            c.execute(f"DROP TABLE IF EXISTS {tbl_name} CASCADE")
-            conn.commit()
-            logger.info(f"{tbl_name} table deleted successfully.")
-        except psycopg2.Error as e:
-            logger.error("Error while deleting table: %s", e)
+    with use_db_connection() as conn:
+        with closing(conn.cursor()) as c:
+            try:
+                c.execute(f"DROP TABLE IF EXISTS {tbl_name} CASCADE")
+                conn.commit()
+                logger.info(f"{tbl_name} table deleted successfully.")
+            except psycopg2.Error as e:
+                logger.error("Error while deleting table: %s", e)
 
 
 def create_table(query: str):
     """テーブル作成の汎用関数"""
     logger.info("Creating table...")
-    with closing(get_db_connection()) as conn:
-        c = conn.cursor()
-        try:
-            c.execute(query)
-            conn.commit()
-            logger.info("Table created successfully.")
-        except psycopg2.Error as e: # sqlite3.Error < for sqlite
-            logger.error("Error while creating table: %s", e)
+    with use_db_connection() as conn:
+        with closing(conn.cursor()) as c:
+            try:
+                c.execute(query)
+                conn.commit()
+                logger.info("Table created successfully.")
+            except psycopg2.Error as e: # sqlite3.Error < for sqlite
+                logger.error("Error while creating table: %s", e)
 
 
 def create_cid_table():
@@ -136,12 +204,117 @@ def create_contents_table():
             view_count INTEGER,
             like_count INTEGER,
             duration TEXT,
-            channel_category INTEGER
+            channel_category INTEGER,
+            published_at TIMESTAMPTZ,
+            duration_seconds INTEGER,
+            upload_date_display TEXT,
+            embed_url TEXT,
+            popularity DOUBLE PRECISION NOT NULL DEFAULT 0
         )
     '''
     create_table(query)
 
 
+def migrate_contents_typed_columns():
+    """既存の`contents`テーブルに型付きカラム・表示用カラムを追加し、未設定の行を埋める"""
+    logger.info("Migrating 'contents' table to typed upload_date / duration columns...")
+    create_table('''
+        ALTER TABLE contents
+            ADD COLUMN IF NOT EXISTS published_at TIMESTAMPTZ,
+            ADD COLUMN IF NOT EXISTS duration_seconds INTEGER,
+            ADD COLUMN IF NOT EXISTS upload_date_display TEXT,
+            ADD COLUMN IF NOT EXISTS embed_url TEXT,
+            ADD COLUMN IF NOT EXISTS popularity DOUBLE PRECISION NOT NULL DEFAULT 0
+    ''')
+
+    with use_db_connection() as conn:
+        with closing(conn.cursor()) as c:
+            try:
+                c.execute('''
+                    SELECT id, upload_date, duration, video_url FROM contents
+                    WHERE upload_date_display IS NULL OR embed_url IS NULL
+                ''')
+                rows = []
+                for video_id, upload_date, duration, video_url in c.fetchall():
+                    fields = derived_content_fields(upload_date, duration, video_url)
+                    rows.append((video_id, fields["published_at"], fields["duration_seconds"],
+                                 fields["upload_date_display"], fields["embed_url"]))
+
+                execute_values(c, '''
+                    UPDATE contents SET
+                        published_at = v.published_at::timestamptz,
+                        duration_seconds = v.duration_seconds::integer,
+                        upload_date_display = v.upload_date_display,
+                        embed_url = v.embed_url
+                    FROM (VALUES %s) AS v (id, published_at, duration_seconds, upload_date_display, embed_url)
+                    WHERE contents.id = v.id
+                ''', rows)
+                conn.commit()
+                logger.info("Backfilled typed columns for %d rows.", len(rows))
+            except psycopg2.Error as e:
+                conn.rollback()
+                logger.error("Error while migrating 'contents' table: %s", e)
+
+
+def update_popularity_scores():
+    """全動画の人気スコアを再計算する（新しさの重みが古くならないよう取り込みのたびに実行）
+
+    行を読み込まずに DB 側の1回の UPDATE で計算し、POPULARITY_EPSILON より大きく変わった行だけ書き換える。
+    """
+    logger.info("Updating popularity scores in 'contents' table...")
+    with use_db_connection() as conn:
+        with closing(conn.cursor()) as c:
+            try:
+                c.execute(f'''
+                    UPDATE contents SET popularity = {POPULARITY_SQL}
+                    WHERE abs(popularity - {POPULARITY_SQL}) > %(epsilon)s
+                ''', {"now": datetime.now(timezone.utc), "epsilon": POPULARITY_EPSILON})
+                conn.commit()
+                logger.info("Popularity scores updated for %d rows.", c.rowcount)
+            except psycopg2.Error as e:
+                conn.rollback()
+                logger.error("Error while updating popularity scores: %s", e)
+
+
+# title ILIKE '%...%' をインデックスで処理できるように pg_trgm の GIN インデックスを張る
+TITLE_SEARCH_INDEX_QUERY = '''
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    CREATE INDEX IF NOT EXISTS contents_title_trgm_idx
+        ON contents USING gin (title gin_trgm_ops)
+'''
+
+
+def create_title_search_index():
+    """`contents.title`の部分一致検索用インデックスを作成"""
+    logger.info("Creating trigram index on 'contents.title'...")
+    create_table(TITLE_SEARCH_INDEX_QUERY)
+
+
+def create_range_filter_indexes():
+    """動画時間・アップロード日の範囲検索用インデックスを作成"""
+    logger.info("Creating range filter indexes on 'contents'...")
+    create_table('''
+        CREATE INDEX IF NOT EXISTS contents_duration_seconds_idx ON contents (duration_seconds);
+        CREATE INDEX IF NOT EXISTS contents_published_at_idx ON contents (published_at DESC, ID DESC)
+    ''')
+
+
+# 並び替えキーごとの (sort_expression DESC, ID DESC) のインデックス（ORDER BY ... DESC, ID DESC とカーソルの条件に一致）
+# NULL を先頭に並べていた以前の (カラム DESC, ID DESC) のインデックスは削除する
+# （published_at のものはアップロード日の範囲検索用に create_range_filter_indexes で残す）
+SORT_INDEX_QUERY = ";".join(
+    [f"CREATE INDEX IF NOT EXISTS contents_{SORT_KEYS[sort]}_sort_idx ON contents (({sort_expression(sort, '')}) DESC, ID DESC)"
+     for sort in SORT_KEYS]
+    + [f"DROP INDEX IF EXISTS contents_{column}_idx" for column in SORT_KEYS.values() if column != 'published_at']
+)
+
+
+def create_sort_indexes():
+    """並び替えキーごとに (カラム DESC, ID DESC) のインデックスを作成（上位N件をインデックスから読む）"""
+    logger.info("Creating sort indexes on 'contents'...")
+    create_table(SORT_INDEX_QUERY)
+
+
 def create_category_table():
     """`category`テーブルを作成"""
     logger.info("Creating 'category' table...")
@@ -175,6 +348,152 @@ def create_feedback_table():
     # id INTEGER PRIMARY KEY AUTOINCREMENT, < for sqlite
 
 
+def create_catalog_version_table():
+    """`catalog_version`テーブルを作成（取り込みのたびにバージョンを上げる）"""
+    logger.info("Creating 'catalog_version' table...")
+    query = '''
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    '''
+    create_table(query)
+
+
+def create_channel_watermarks_table():
+    """`channel_watermarks`テーブルを作成（チャンネルごとの取り込み済みの最新の公開日時と最終実行日時）"""
+    logger.info("Creating 'channel_watermarks' table...")
+    query = '''
+        CREATE TABLE IF NOT EXISTS channel_watermarks (
+            cid TEXT PRIMARY KEY,
+            last_published_at TIMESTAMPTZ,
+            last_run_at TIMESTAMPTZ
+        )
+    '''
+    create_table(query)
+
+
+def get_channel_watermark(cid: str):
+    """チャンネルの取り込み済みの最新の公開日時を取得（未取り込みの場合は None）"""
+    with use_db_connection() as conn:
+        with closing(conn.cursor()) as c:
+            c.execute('SELECT last_published_at FROM channel_watermarks WHERE cid = %s', (cid,))
+            result = c.fetchone()
+            conn.rollback()
+            return result[0] if result else None
+
+
+def update_channel_watermark(cid: str, last_published_at):
+    """取り込みが終わったチャンネルのウォーターマークを進める（公開日時は後戻りさせない）"""
+    with use_db_connection() as conn:
+        with closing(conn.cursor()) as c:
+            try:
+                c.execute('''
+                    INSERT INTO channel_watermarks (cid, last_published_at, last_run_at)
+                    VALUES (%s, %s, now())
+                    ON CONFLICT (cid) DO UPDATE SET
+                        last_published_at = GREATEST(channel_watermarks.last_published_at, EXCLUDED.last_published_at),
+                        last_run_at = EXCLUDED.last_run_at
+                ''', (cid, last_published_at))
+                conn.commit()
+                logger.info("Watermark for channel %s: %s", cid, last_published_at)
+            except psycopg2.Error as e:
+                conn.rollback()
+                logger.error("Error while updating watermark for channel %s: %s", cid, e)
+
+
+def bump_catalog_version():
+    """カタログ（contents / category / cid）の変更をバージョン番号で通知する"""
+    logger.info("Bumping catalog version...")
+    with use_db_connection() as conn:
+        with conn.cursor() as c:
+            try:
+                c.execute('''
+                    INSERT INTO catalog_version (id, version) VALUES (1, 1)
+                    ON CONFLICT (id) DO UPDATE
+                    SET version = catalog_version.version + 1, updated_at = CURRENT_TIMESTAMP
+                ''')
+                conn.commit()
+            except psycopg2.Error as e:
+                conn.rollback()
+                logger.error("Error while bumping catalog version: %s", e)
+
+
+def get_catalog_version():
+    """現在のカタログバージョンを取得（取得できない場合は None）"""
+    conn = pool.getconn()  # リクエスト外からも呼ばれるのでプールから直接取得
+    try:
+        with conn.cursor() as c:
+            c.execute('SELECT version FROM catalog_version WHERE id = 1')
+            result = c.fetchone()
+            conn.rollback()  # 読み取りのみなのでトランザクションを閉じる
+            return result[0] if result else 0
+    except psycopg2.Error as e:
+        conn.rollback()
+        logger.error("Error while loading catalog version: %s", e)
+        return None
+    finally:
+        pool.putconn(conn)
+
+
+def load_content_titles():
+    """タイトル検索インデックス用に contents の (ID, タイトル) を取得"""
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as c:
+            c.execute('SELECT ID, title FROM contents')
+            results = c.fetchall()
+            conn.rollback()
+            logger.info("Loaded %d titles from 'contents' table.", len(results))
+            return results
+    finally:
+        pool.putconn(conn)
+
+
+def load_search_rows():
+    """ファセットインデックス用に検索結果の行とフィルタの値を全件取得"""
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as c:
+            c.execute(build_index_rows_query())
+            results = c.fetchall()
+            conn.rollback()
+            logger.info("Loaded %d rows for facet index.", len(results))
+            return results
+    finally:
+        pool.putconn(conn)
+
+
+def load_facet_values():
+    """検索フィルタの選択肢（カテゴリ・人数・レベル・チャンネル）をまとめて取得"""
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as c:
+            facets = {}
+            for column in ('category_title', 'players'):
+                c.execute(f'''
+                    SELECT DISTINCT {column}
+                    FROM category
+                    WHERE {column} IS NOT NULL AND {column} != ''
+                    ORDER BY {column} ASC
+                ''')
+                facets[column] = [row[0] for row in c.fetchall()]
+
+            c.execute("SELECT DISTINCT level FROM category")
+            facets['levels'] = [{"level": row[0]} for row in c.fetchall()]
+
+            c.execute("SELECT id, cname, clink FROM cid")
+            facets['channels'] = [
+                {"id": row[0], "channel_name": row[1], "channel_link": row[2]} for row in c.fetchall()
+            ]
+            conn.rollback()
+            logger.info("Loaded facet values: %s", {k: len(v) for k, v in facets.items()})
+            return facets
+    finally:
+        pool.putconn(conn)
+
+
 def insert_cid_data(cid: str, cname: str, clink: str):
     """`cid`テーブルにデータを挿入"""
     logger.info("Inserting data into 'cid' table...")
@@ -193,25 +512,49 @@ def insert_cid_data(cid: str, cname: str, clink: str):
 
 
 def insert_category_data(contents_data, channel_category):
-    """`category`テーブルにデータを挿入"""
+    """`category`テーブルにデータをまとめて挿入（一時テーブル経由でバッチごとに1回マージ）
+
+    追加した行数を返す（エラーの場合は None）。
+    """
     logger.info("Inserting data into 'category' table...")
-    with closing(get_db_connection()) as conn:
-        c = conn.cursor()
+    rows = category_rows(contents_data, channel_category)
+    with use_db_connection() as conn:
         try:
-            for data in contents_data:
-                c.execute('''
-                    INSERT INTO category (ID, category_title, players, level, channel_brand_category)
-                    VALUES (%s, %s, %s, %s, %s) ON CONFLICT (ID) DO NOTHING
-                ''', (data["id"], data["category"], data["nop"], data["level"], channel_category))
-                conn.commit()
-            logger.info("Data inserted into 'category' table successfully.")
+            written = bulk_upsert(conn, 'category', CATEGORY_COLUMNS, rows)
+            logger.info("Data inserted into 'category' table successfully (%d new of %d).", written, len(rows))
+            return written
         except psycopg2.Error as e:
             logger.error("Error while inserting data into 'category' table: %s", e)
+            return None
+
+
+def insert_chunk_data(video_data, contents_data, channel_category):
+    """1チャンク分の動画を`contents`と`category`テーブルに1つのトランザクションで挿入
+
+    テーブルごとの追加した行数 (contents, category) を返す（エラーの場合は None で、どちらにも書き込まない）。
+    """
+    logger.info("Inserting %d videos into 'contents' and 'category' tables...", len(video_data))
+    writes = [
+        ('contents', CONTENTS_COLUMNS, contents_rows(video_data, channel_category)),
+        ('category', CATEGORY_COLUMNS, category_rows(contents_data, channel_category)),
+    ]
+    with use_db_connection() as conn:
+        try:
+            contents_written, category_written = write_tables(conn, writes)
+            logger.info("Chunk inserted successfully (%d new contents, %d new categories).",
+                        contents_written, category_written)
+            return contents_written, category_written
+        except psycopg2.Error as e:
+            logger.error("Error while inserting chunk into 'contents' and 'category' tables: %s", e)
+            return None
 
 
 def insert_contents_data(video_data, channel_category):
-    """CSVファイルからデータをデータベースに挿入"""
-    logger.info("Inserting data from CSV into 'contents' table...")
+    """取得した動画データを`contents`テーブルにまとめて挿入（一時テーブル経由でバッチごとに1回マージ）
+
+    追加した行数を返す（エラーの場合は None）。
+    """
+    logger.info("Inserting %d videos into 'contents' table...", len(video_data))
     #df = pd.read_csv(file_path)
     #duplicates = find_duplicates(df)
 
@@ -224,51 +567,43 @@ def insert_contents_data(video_data, channel_category):
     #     else:
     #         logger.info("Processing stopped due to duplicate IDs.")
     #         return
+    # 日時・動画時間の型変換・表示用の値・人気スコアは書き込み時に済ませておく
+    rows = contents_rows(video_data, channel_category)
+
     with use_db_connection() as conn:  # データベース接続
-        with closing(conn.cursor()) as c:  # カーソルのクローズを自動管理
-            try:
-                for data in video_data:
-                    # like_count の変換処理
-                    like_count = data.get('like_count')
-                    if like_count in ('N/A', None):
-                        like_count = None
-                    else:
-                        try:
-                            like_count = int(like_count)
-                        except ValueError:
-                            logger.warning("Invalid like_count value for ID %s: %s", data['id'], like_count)
-                            like_count = None  # 数値変換できない場合は None にする
-
-                    # channel_category の存在チェック
-                    #channel_category = data.get('channel_category', None)  # デフォルト値を None に
-
-                    logger.info(
-                        "INSERTするデータ: %s, %s, %s, %s, %s, %s, %s, %s",
-                        data['id'], data['title'], data['upload_date'], data['url'],
-                        data['view_count'], like_count, data['duration'], channel_category
-                    )
-
-                    # データ挿入
-                    try:
-                        c.execute('''
-                            INSERT INTO contents (id, title, upload_date, video_url, 
-                            view_count, like_count, duration, channel_category)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s) 
-                            ON CONFLICT (id) DO NOTHING
-                        ''', (
-                            data['id'], data['title'], data['upload_date'], data['url'],
-                            data['view_count'], like_count, data['duration'], channel_category
-                        ))
-                    except psycopg2.Error as e:
-                        logger.error("Error while inserting data for ID %s: %s", data['id'], e)
-                        conn.rollback()  # エラー発生時にロールバック
-
-                conn.commit()  # すべての処理が成功したらコミット
-                logger.info("All data inserted successfully into 'contents' table.")
-
-            except Exception as e:
-                conn.rollback()  # 致命的なエラーが発生した場合にロールバック
-                logger.error("Unexpected error: %s", e)
+        try:
+            written = bulk_upsert(conn, 'contents', CONTENTS_COLUMNS, rows)
+            logger.info("All data inserted successfully into 'contents' table (%d new of %d).", written, len(rows))
+            return written
+        except psycopg2.Error as e:
+            logger.error("Error while inserting data into 'contents' table: %s", e)
+            return None
+
+
+def iter_content_chunks(chunk_size: int = 50):
+    """contents の (ID, published_at) を ID 順に chunk_size 件ずつ返す（キーセットで読み進め、全件を一度に読まない）"""
+    last_id = ''
+    while True:
+        with use_db_connection() as conn:
+            with closing(conn.cursor()) as c:
+                c.execute('SELECT id, published_at FROM contents WHERE id > %s ORDER BY id LIMIT %s',
+                          (last_id, chunk_size))
+                chunk = c.fetchall()
+                conn.rollback()
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1][0]
+
+
+def update_content_stats(rows):
+    """再生回数・いいね数・人気スコアを、件数が変わった動画だけまとめて更新する（更新した行数を返す）"""
+    with use_db_connection() as conn:
+        try:
+            return bulk_update(conn, 'contents', STATS_COLUMNS, rows, compare_columns=STATS_COMPARE_COLUMNS)
+        except psycopg2.Error as e:
+            logger.error("Error while updating video statistics: %s", e)
+            return 0
 
 
 def search_content_table():
@@ -281,13 +616,12 @@ def search_content_table():
         #c.execute("SELECT * FROM contents WHERE id = %s;", ('B-uDfqk20ac',))
         results = c.fetchall()
         logger.info("Search completed. Found %d records.", len(results))
-        print(results)
         return [[result[0], result[1]] for result in results]
 
 # def search_table(search_term: str = None):
 #     """`contents`テーブルからデータを検索"""
 #     logger.info("Searching data in 'contents' table...")
-#     with closing(get_db_connection()) as conn:
+#     with use_db_connection() as conn:
 #         c = conn.cursor()
 #         query = 'SELECT * FROM contents'
 #         if search_term:
@@ -302,19 +636,6 @@ def search_content_table():
 #         return [[result[0], result[1]] for result in results]
 
 
-def get_channel_name_from_id(id):
-    """ 指定した ID のチャンネル名を取得 """
-    conn = pool.getconn()  # コネクションプールから接続を取得
-    try:
-        with conn.cursor() as c:
-            query = 'SELECT cname FROM cid WHERE id = %s'  # プレースホルダーを使用
-            c.execute(query, (id,))  # タプルで値を渡す
-            result = c.fetchone()  # 1行のみ取得
-            return result[0] if result else None  # データがあれば返す、なければ None
-    finally:
-        pool.putconn(conn)  # 使用後に接続をプールに戻す
-
-
 def search_db():
     """データベースのテーブル一覧を表示"""
     logger.info("Fetching list of tables in the database...")
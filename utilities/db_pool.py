@@ -0,0 +1,289 @@
+import threading
+import time
+import logging
+from collections import deque
+from typing import Callable, Dict, Optional
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.pool import PoolError
+
+
+# ロガーの設定
+logging.basicConfig(
+    level=logging.INFO,  # ログレベルを INFO に設定
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # 標準出力にログを表示
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+class InstrumentedPool:
+    """スレッドセーフな接続プール（貸し出し時のヘルスチェック・長時間の貸し出しの検出・計測付き）
+
+    psycopg2 の SimpleConnectionPool と同じ getconn / putconn / closeall を持つ。
+    上限まで貸し出し中の場合は checkout_timeout 秒まで返却を待つ。
+    """
+
+    def __init__(self, minconn: int, maxconn: int, dsn: Optional[str] = None,
+                 connect: Optional[Callable] = None, checkout_timeout: float = 30.0,
+                 leak_seconds: float = 30.0, health_check_idle: float = 60.0):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.checkout_timeout = checkout_timeout
+        self.leak_seconds = leak_seconds
+        self.health_check_idle = health_check_idle
+        self._connect = connect or (lambda: psycopg2.connect(dsn))
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._idle = deque()  # (接続, 返却された時刻)
+        self._in_use: Dict[int, dict] = {}  # id(接続) → 貸し出し情報
+        self._closed = False
+
+        self.checkouts = 0
+        self.timeouts = 0
+        self.discarded = 0
+        self.leaks_reported = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def getconn(self, owner: Optional[str] = None):
+        """接続を貸し出す（owner は長時間の貸し出しを記録するときの目印）"""
+        if self._closed:
+            raise PoolError("connection pool is closed")
+
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolError("connection pool exhausted")
+        waited = time.monotonic() - start
+
+        try:
+            conn = self._checkout_healthy()
+        except Exception:
+            self._slots.release()
+            raise
+
+        now = time.monotonic()
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            self._in_use[id(conn)] = {
+                "conn": conn,
+                "since": now,
+                "owner": owner or threading.current_thread().name,
+                "reported": False,
+            }
+        self.check_leaks()
+        return conn
+
+    def _checkout_healthy(self):
+        """待機中の接続から使えるものを取り出す（なければ新しく接続する）"""
+        while True:
+            with self._lock:
+                entry = self._idle.popleft() if self._idle else None
+            if entry is None:
+                return self._connect()
+
+            conn, returned_at = entry
+            if conn.closed:
+                self._discard(conn, "closed while idle")
+                continue
+            if time.monotonic() - returned_at >= self.health_check_idle:
+                try:
+                    with conn.cursor() as c:
+                        c.execute("SELECT 1")
+                    conn.rollback()
+                except psycopg2.Error as e:
+                    self._discard(conn, f"health check failed: {e}")
+                    continue
+            return conn
+
+    def _discard(self, conn, reason: str):
+        logger.warning("Discarding pooled connection (%s)", reason)
+        with self._lock:
+            self.discarded += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def putconn(self, conn, close: bool = False):
+        """接続を返却する（未完了のトランザクションはロールバックする）"""
+        with self._lock:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            logger.warning("Returned connection does not belong to this pool")
+            return
+
+        try:
+            if not conn.closed and not close and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error as e:
+            logger.warning("Error while resetting connection: %s", e)
+            close = True
+
+        if close or self._closed or conn.closed:
+            if not conn.closed:
+                conn.close()
+        else:
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        self._slots.release()
+
+    def check_leaks(self):
+        """leak_seconds を超えて返却されていない接続をログに出す（1接続につき1回）"""
+        now = time.monotonic()
+        leaked = []
+        with self._lock:
+            for entry in self._in_use.values():
+                if not entry["reported"] and now - entry["since"] > self.leak_seconds:
+                    entry["reported"] = True
+                    self.leaks_reported += 1
+                    leaked.append((entry["owner"], now - entry["since"]))
+        for owner, held in leaked:
+            logger.warning("Database connection held for %.1fs without being returned (owner: %s)", held, owner)
+
+    def start_leak_detector(self, interval: float = 10.0):
+        """バックグラウンドで定期的に check_leaks を実行する"""
+        def run():
+            while not self._closed:
+                time.sleep(interval)
+                self.check_leaks()
+
+        thread = threading.Thread(target=run, name="db-pool-leak-detector", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> dict:
+        """ワーカー数・max_connections の調整用の値"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "maxconn": self.maxconn,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "discarded": self.discarded,
+                "leaks_reported": self.leaks_reported,
+                "held_past_deadline": sum(1 for e in self._in_use.values() if now - e["since"] > self.leak_seconds),
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+            }
+
+    def closeall(self):
+        """待機中の接続をすべて閉じる（貸し出し中の接続は返却時に閉じる）"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            if not conn.closed:
+                conn.close()
+
+
+class ReadRouter:
+    """読み取り専用の接続をレプリカのプールに振り分ける（ラウンドロビン、失敗時はプライマリ）
+
+    接続できなかったレプリカは retry_seconds の間は使わない。
+    レプリカが満杯の場合もプライマリに切り替える。
+    貸し出し後にクエリが接続エラーになった場合は failover でプライマリの接続に取り替える。
+    """
+
+    def __init__(self, primary: InstrumentedPool, replicas=(), retry_seconds: float = 30.0):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._next = 0
+        self._down_until: Dict[int, float] = {}  # レプリカの番号 → 再び使う時刻
+        self._owners: Dict[int, InstrumentedPool] = {}  # id(接続) → 貸し出したプール
+        self.failovers = 0
+
+    def _candidates(self):
+        """今回試すレプリカの番号（ラウンドロビンの順、停止中のものは除く）"""
+        now = time.monotonic()
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas) if self.replicas else 0
+            order = [(start + i) % len(self.replicas) for i in range(len(self.replicas))]
+            return [i for i in order if self._down_until.get(i, 0) <= now]
+
+    def getconn(self, owner: Optional[str] = None):
+        """読み取り用の接続を貸し出す（レプリカがなければプライマリ）"""
+        for i in self._candidates():
+            try:
+                conn = self.replicas[i].getconn(owner=owner)
+            except psycopg2.OperationalError as e:
+                logger.warning("Read replica %d is unavailable, skipping for %.0fs: %s", i, self.retry_seconds, e)
+                self._mark_down(i)
+                continue
+            except PoolError as e:
+                logger.warning("Read replica %d pool is exhausted: %s", i, e)
+                with self._lock:
+                    self.failovers += 1
+                continue
+            with self._lock:
+                self._owners[id(conn)] = self.replicas[i]
+            return conn
+
+        return self._getconn_primary(owner)
+
+    def _getconn_primary(self, owner: Optional[str] = None):
+        conn = self.primary.getconn(owner=owner)
+        with self._lock:
+            self._owners[id(conn)] = self.primary
+        return conn
+
+    def _mark_down(self, i: int):
+        with self._lock:
+            self._down_until[i] = time.monotonic() + self.retry_seconds
+            self.failovers += 1
+
+    def failover(self, conn, error: psycopg2.OperationalError, owner: Optional[str] = None):
+        """クエリ中に接続エラーになった接続を破棄し、代わりにプライマリの接続を貸し出す
+
+        レプリカの接続だった場合はそのレプリカを retry_seconds の間は使わない。
+        プライマリの接続だった場合は error をそのまま送出する。
+        """
+        with self._lock:
+            owner_pool = self._owners.pop(id(conn), self.primary)
+        owner_pool.putconn(conn, close=True)
+        if owner_pool is self.primary:
+            raise error
+
+        i = self.replicas.index(owner_pool)
+        logger.warning("Read replica %d failed during a query, retrying on primary and skipping it for %.0fs: %s",
+                       i, self.retry_seconds, error)
+        self._mark_down(i)
+        return self._getconn_primary(owner)
+
+    def putconn(self, conn, close: bool = False):
+        """接続を貸し出したプールに返却する"""
+        with self._lock:
+            owner_pool = self._owners.pop(id(conn), self.primary)
+        owner_pool.putconn(conn, close=close)
+
+    def stats(self) -> dict:
+        """レプリカごとのプールの使用状況と切り替え回数"""
+        now = time.monotonic()
+        with self._lock:
+            down = {i for i, until in self._down_until.items() if until > now}
+            failovers = self.failovers
+        return {
+            "failovers": failovers,
+            "replicas": [dict(replica.stats(), available=i not in down) for i, replica in enumerate(self.replicas)],
+        }
+
+    def closeall(self):
+        for replica in self.replicas:
+            replica.closeall()
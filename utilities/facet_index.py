@@ -0,0 +1,178 @@
+import bisect
+import threading
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utilities.search_query import FACET_KEYS, FILTER_COLUMNS, SELECT_COLUMNS, SORT_KEYS, has_range_filters, sort_column
+
+
+# ロガーの設定
+logging.basicConfig(
+    level=logging.INFO,  # ログレベルを INFO に設定
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # 標準出力にログを表示
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+# あらかじめ並び順を持っておく並び替えキー
+PRESORTED_KEYS = tuple(SORT_KEYS)
+
+
+def popcount(bitmap: int) -> int:
+    """ビットマップの立っているビット数（= 件数）"""
+    return bin(bitmap).count("1")
+
+
+def sort_key(value: Any, video_id: str) -> Tuple:
+    """昇順の並び順のキー（逆順にたどると ORDER BY sort_expression DESC, ID DESC と同じ順になり、NULL は最後）"""
+    return (value is not None, value, video_id)
+
+
+class FacetIndex:
+    """フィルタだけの検索を DB に問い合わせずに処理するためのビットマップインデックス
+
+    動画ごとに位置（ビット番号）を割り当て、フィルタの値ごとに該当する動画のビットマップを持つ。
+    検索はビットマップの AND と、並び替えキーごとに事前に並べた順序のスライスで行う。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()  # 検索と差し替えの排他（差し替えの間だけ持つ）
+        self._update_lock = threading.Lock()  # update 同士の排他
+        self._positions: Dict[str, int] = {}  # 動画ID → 位置
+        self._rows: List[Tuple] = []  # 位置 → SELECT_COLUMNS の並びの行
+        self._filter_values: List[Tuple] = []  # 位置 → フィルタの値
+        self._all = 0
+        self._bitmaps: Dict[str, Dict[str, int]] = {name: {} for name in FILTER_COLUMNS}
+        self._orders: Dict[str, List[Tuple]] = {sort: [] for sort in PRESORTED_KEYS}
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple]) -> "FacetIndex":
+        """load_search_rows の行（SELECT_COLUMNS + フィルタのカラム）からインデックスを作成"""
+        index = cls()
+        index.update(rows)
+        return index
+
+    def update(self, rows: Iterable[Tuple]):
+        """最新の全行からビットマップと並び順を作り直して差し替える
+
+        作り直しはロックの外で行い（並び順は並び替えキーごとに1回の sorted）、
+        検索を待たせるのは差し替えの間だけにする。
+        """
+        width = len(SELECT_COLUMNS)
+        with self._update_lock:
+            positions: Dict[str, int] = {}
+            contents: List[Tuple] = []
+            filter_values: List[Tuple] = []
+            for row in rows:
+                content, values = tuple(row[:width]), tuple(row[width:])
+                position = positions.setdefault(row[0], len(contents))
+                if position == len(contents):
+                    contents.append(content)
+                    filter_values.append(values)
+                else:
+                    contents[position], filter_values[position] = content, values
+
+            bitmaps = self._build_bitmaps(filter_values, len(contents))
+            orders = {
+                sort: sorted((self._sort_key(content, sort), position) for position, content in enumerate(contents))
+                for sort in PRESORTED_KEYS
+            }
+
+            old_positions = self._positions
+            added = sum(1 for video_id in positions if video_id not in old_positions)
+            changed = sum(
+                1 for video_id, position in positions.items()
+                if video_id in old_positions and (
+                    self._rows[old_positions[video_id]] != contents[position]
+                    or self._filter_values[old_positions[video_id]] != filter_values[position])
+            )
+            removed = sum(1 for video_id in old_positions if video_id not in positions)
+
+            with self._lock:
+                self._positions, self._rows, self._filter_values = positions, contents, filter_values
+                self._all = (1 << len(contents)) - 1
+                self._bitmaps, self._orders = bitmaps, orders
+
+        logger.info("Facet index updated: %d added, %d changed, %d removed (%d videos)",
+                    added, changed, removed, len(positions))
+
+    @staticmethod
+    def _build_bitmaps(filter_values: List[Tuple], size: int) -> Dict[str, Dict[str, int]]:
+        """フィルタの値ごとのビットマップ（bytearray でビットを立ててから int にする）"""
+        buffers: Dict[str, Dict[str, bytearray]] = {name: {} for name in FILTER_COLUMNS}
+        for position, values in enumerate(filter_values):
+            for name, value in zip(FILTER_COLUMNS, values):
+                if value is not None:
+                    buffer = buffers[name].get(str(value))
+                    if buffer is None:
+                        buffer = buffers[name][str(value)] = bytearray((size + 7) // 8)
+                    buffer[position >> 3] |= 1 << (position & 7)
+        return {
+            name: {value: int.from_bytes(buffer, "little") for value, buffer in values.items()}
+            for name, values in buffers.items()
+        }
+
+    @staticmethod
+    def _sort_key(content: Tuple, sort: str) -> Tuple:
+        return sort_key(content[SELECT_COLUMNS.index(sort_column(sort))], content[0])
+
+    def _mask(self, filters: Dict, exclude: Optional[str] = None) -> int:
+        mask = self._all
+        for name in FILTER_COLUMNS:
+            if name != exclude and filters.get(name):
+                mask &= self._bitmaps[name].get(str(filters[name]), 0)
+        return mask
+
+    def search(self, filters: Dict, sort: str, limit: int, offset: int,
+               cursor: Optional[Tuple] = None) -> Optional[Tuple[List[Tuple], int]]:
+        """フィルタに一致する1ページ分の行と総件数を返す（対応していない条件の場合は None）
+
+        cursor（decode_cursor の戻り値）を指定した場合は OFFSET の代わりにその続きから返す。
+        範囲フィルタは DB の B-tree インデックスで処理するのでここでは扱わない。
+        """
+        if sort not in self._orders or has_range_filters(filters):
+            return None
+
+        with self._lock:
+            mask = self._mask(filters)
+            order = self._orders[sort]
+            if cursor is not None:
+                start = bisect.bisect_left(order, (sort_key(*cursor), -1))
+                offset = 0
+            else:
+                start = len(order)
+
+            rows = []
+            for i in range(start - 1, -1, -1):
+                if len(rows) >= limit:
+                    break
+                position = order[i][1]
+                if not mask >> position & 1:
+                    continue
+                if offset > 0:
+                    offset -= 1
+                    continue
+                rows.append(self._rows[position])
+            return rows, popcount(mask)
+
+    def facet_counts(self, filters: Dict) -> Optional[Dict[str, Dict[str, int]]]:
+        """フィルタの値ごとの一致件数（各フィルタ自身は除いた条件で数える。範囲フィルタがあれば None）"""
+        if has_range_filters(filters):
+            return None
+        with self._lock:
+            counts = {}
+            for name, key in FACET_KEYS.items():
+                mask = self._mask(filters, exclude=name)
+                values = {}
+                for value, bitmap in self._bitmaps[name].items():
+                    count = popcount(bitmap & mask)
+                    if count:
+                        values[value] = count
+                counts[key] = values
+            return counts
+
+    def __len__(self):
+        return len(self._positions)
@@ -1,6 +1,9 @@
 import requests
 import logging
-from typing import Optional
+from typing import Dict, List, Optional
+
+from utilities.get_videos import YOUTUBE_API_BASE, remember_uploads_playlist
+from utilities.http_client import get_json
 
 # ロガーの設定
 logging.basicConfig(
@@ -13,25 +16,48 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# channels API に一度に渡せるチャンネルIDの上限
+CHANNELS_PER_REQUEST = 50
+
+
 def get_channel_details(channel_id, api_key):
-    url = f"https://www.googleapis.com/youtube/v3/channels?part=brandingSettings&id={channel_id}&key={api_key}"
-    response = requests.get(url)
-    data = response.json()
+    url = f"{YOUTUBE_API_BASE}/channels?part=brandingSettings&id={channel_id}&key={api_key}"
+    try:
+        data = get_json(url, endpoint="channels")
+    except requests.exceptions.RequestException as e:
+        logger.error("Error fetching channel details: %s", e)
+        return 'N/A'
     if 'items' in data and len(data['items']) > 0:
         return data['items'][0]['brandingSettings']['channel'].get('title', 'N/A')
     return 'N/A'
 
 
+def get_channels_details(channel_ids: List[str], api_key: str) -> Dict[str, str]:
+    """複数のチャンネル名を50件ずつまとめて取得する（チャンネルID → チャンネル名、取得できなければ 'N/A'）
+
+    同じレスポンスの contentDetails からアップロード動画の再生リストIDも保存し、
+    動画一覧の取得でチャンネルごとに channels API を呼ばないようにする。
+    """
+    titles = {channel_id: 'N/A' for channel_id in channel_ids}
+    for start in range(0, len(channel_ids), CHANNELS_PER_REQUEST):
+        chunk = channel_ids[start:start + CHANNELS_PER_REQUEST]
+        url = f"{YOUTUBE_API_BASE}/channels?part=brandingSettings,contentDetails&id={','.join(chunk)}&key={api_key}"
+        try:
+            for item in get_json(url, endpoint="channels").get('items', []):
+                titles[item['id']] = item['brandingSettings']['channel'].get('title', 'N/A')
+                remember_uploads_playlist(item['id'], item.get('contentDetails', {}).get('relatedPlaylists', {}).get('uploads'))
+        except requests.exceptions.RequestException as e:
+            logger.error("Error fetching channel details: %s", e)
+    return titles
+
+
 def get_channel_id(handle: str, api_key: str) -> Optional[str]:
     """チャンネルハンドルからチャンネルIDを取得する"""
     logger.info("Fetching channel ID for handle: %s", handle)
-    url = f"https://www.googleapis.com/youtube/v3/search?part=snippet&q={handle}&type=channel&key={api_key}"
+    url = f"{YOUTUBE_API_BASE}/search?part=snippet&q={handle}&type=channel&key={api_key}"
 
     try:
-        response = requests.get(url)
-        response.raise_for_status()  # ステータスコードがエラーの場合例外を発生
-
-        data = response.json()
+        data = get_json(url, endpoint="search")  # ステータスコードがエラーの場合例外を発生
         for item in data.get('items', []):
             channel_id = item['id']['channelId']
             logger.info("Channel ID found: %s", channel_id)
@@ -1,11 +1,16 @@
-import requests
-import time
 import isodate
 import logging
-from typing import Optional, List, Dict
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, Optional, List, Dict
 import csv
 import os
 
+from utilities.content_fields import parse_upload_date
+from utilities.http_client import get_json
+
+# YouTube Data API のベースURL（テストではローカルのスタブに向ける）
+YOUTUBE_API_BASE = os.getenv('YOUTUBE_API_BASE', 'https://www.googleapis.com/youtube/v3')
+
 # ロガーの設定
 logging.basicConfig(
     level=logging.INFO,  # ログレベルを INFO に設定
@@ -17,6 +22,10 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+class PageFetchError(Exception):
+    """次のページがあるのに取得できなかった（途中までしか取得していないので取り込み完了として扱わない）"""
+
+
 def convert_duration(duration: str) -> str:
     """ISO 8601形式の動画長さを人間が読める形式に変換"""
     try:
@@ -28,30 +37,64 @@ def convert_duration(duration: str) -> str:
 
 
 def fetch_video_details(video_ids: List[str], api_key: str) -> List[Dict]:
-    """動画IDリストから詳細情報を取得"""
-    video_details_url = f"https://www.googleapis.com/youtube/v3/videos?key={api_key}&id={','.join(video_ids)}&part=statistics,contentDetails"
-    try:
-        response = requests.get(video_details_url)
-        response.raise_for_status()
-        logger.info("Fetched video details for %d videos", len(video_ids))
-        return response.json().get('items', [])
-    except requests.exceptions.RequestException as e:
-        logger.error("Failed to fetch video details: %s", e)
-        return []
-
-
-def fetch_videos_from_channel(channel_id: str, api_key: str, next_page_token: Optional[str] = None) -> Dict:
-    """チャンネルから動画一覧を取得"""
-    base_url = f"https://www.googleapis.com/youtube/v3/search?key={api_key}&channelId={channel_id}&part=snippet&type=video&maxResults=50"
+    """動画IDリストから詳細情報を取得（再試行しても失敗した場合は requests.exceptions.RequestException）"""
+    video_details_url = f"{YOUTUBE_API_BASE}/videos?key={api_key}&id={','.join(video_ids)}&part=statistics,contentDetails"
+    data = get_json(video_details_url, endpoint="videos")
+    logger.info("Fetched video details for %d videos", len(video_ids))
+    return data.get('items', [])
+
+
+def to_rfc3339(dt: datetime) -> str:
+    """API の publishedAfter に渡す形式（UTC, 例: "2023-11-22T02:00:00Z"）に変換"""
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def fetch_videos_from_channel(channel_id: str, api_key: str, next_page_token: Optional[str] = None,
+                              published_after: Optional[datetime] = None) -> Dict:
+    """チャンネルから動画一覧を新しい順に取得（published_after 以降に公開されたものだけに絞れる）
+
+    再試行しても失敗した場合は requests.exceptions.RequestException を送出する。
+    """
+    base_url = f"{YOUTUBE_API_BASE}/search?key={api_key}&channelId={channel_id}&part=snippet&type=video&maxResults=50&order=date"
+    if published_after is not None:
+        base_url += f"&publishedAfter={to_rfc3339(published_after)}"
     url = f"{base_url}&pageToken={next_page_token}" if next_page_token else base_url
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        logger.info("Fetched video list for channel: %s", channel_id)
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logger.error("Failed to fetch videos from channel: %s. Error: %s", channel_id, e)
-        return {}
+    data = get_json(url, endpoint="search")
+    logger.info("Fetched video list for channel: %s", channel_id)
+    return data
+
+
+# チャンネルID → アップロード動画の再生リストID（get_channels_details がまとめて取得した分を入れておく）
+_uploads_playlists: Dict[str, str] = {}
+
+
+def remember_uploads_playlist(channel_id: str, playlist_id: Optional[str]):
+    """channels API の contentDetails で分かったアップロード動画の再生リストIDを保存する"""
+    if playlist_id:
+        _uploads_playlists[channel_id] = playlist_id
+
+
+def fetch_uploads_playlist_id(channel_id: str, api_key: str) -> Optional[str]:
+    """チャンネルのアップロード動画の再生リストIDを取得（保存済みでなければ1ユニット、チャンネルがなければ None）"""
+    if channel_id in _uploads_playlists:
+        return _uploads_playlists[channel_id]
+    url = f"{YOUTUBE_API_BASE}/channels?key={api_key}&id={channel_id}&part=contentDetails"
+    items = get_json(url, endpoint="channels").get('items', [])
+    if not items:
+        logger.warning("Channel not found: %s", channel_id)
+        return None
+    playlist_id = items[0].get('contentDetails', {}).get('relatedPlaylists', {}).get('uploads')
+    remember_uploads_playlist(channel_id, playlist_id)
+    return playlist_id
+
+
+def fetch_playlist_items(playlist_id: str, api_key: str, next_page_token: Optional[str] = None) -> Dict:
+    """再生リストの動画を50件ずつ取得（search と違い1ページ1ユニット、件数の上限もない）"""
+    base_url = f"{YOUTUBE_API_BASE}/playlistItems?key={api_key}&playlistId={playlist_id}&part=snippet,contentDetails&maxResults=50"
+    url = f"{base_url}&pageToken={next_page_token}" if next_page_token else base_url
+    data = get_json(url, endpoint="playlistItems")
+    logger.info("Fetched playlist items for playlist: %s", playlist_id)
+    return data
 
 
 # def save_video_data_to_csv(output_file: str, video_data: List[Dict]):
@@ -89,51 +132,123 @@ def fetch_videos_from_channel(channel_id: str, api_key: str, next_page_token: Op
 #         logger.error("Failed to save video data to CSV: %s", e)
 
 
-def get_youtube_video_data(channel_id: str, api_key: str) -> List:
-    """指定したチャンネルIDから動画データを取得しCSVに保存"""
+def latest_upload_date(video_data: List[Dict]) -> Optional[datetime]:
+    """取得した動画の中で最も新しい公開日時（ウォーターマーク用、動画がなければ None）"""
+    dates = [parse_upload_date(data['upload_date'])[0] for data in video_data]
+    dates = [dt for dt in dates if dt is not None]
+    return max(dates) if dates else None
+
+
+def take_until_known(entries: List[Dict], published_after: Optional[datetime]):
+    """新しい順の動画のうち published_after より新しいものと、取り込み済みの動画に達したかどうかを返す"""
+    if published_after is None:
+        return entries, False
+    new_entries = []
+    for entry in entries:
+        published_at, _ = parse_upload_date(entry['upload_date'])
+        if published_at is not None and published_at <= published_after:
+            return new_entries, True
+        new_entries.append(entry)
+    return new_entries, False
+
+
+def build_video_data(entries: List[Dict], api_key: str) -> List[Dict]:
+    """(ID, タイトル, 公開日時) に videos API の再生回数・いいね数・動画時間を付けて動画データにする"""
+    video_ids = [entry['id'] for entry in entries]
+    details = fetch_video_details(video_ids, api_key) if video_ids else []
+    details_by_id = {detail['id']: detail for detail in details}
+
     video_data = []
-    next_page_token = None
+    for entry in entries:
+        video_id = entry['id']
+        # 詳細情報を検索
+        detail = details_by_id.get(video_id, {})
+        video_data.append({
+            'id': video_id,
+            'title': entry['title'],
+            'upload_date': entry['upload_date'],
+            'url': f"https://www.youtube.com/watch?v={video_id}",
+            'view_count': detail.get('statistics', {}).get('viewCount', 'N/A'),
+            'like_count': detail.get('statistics', {}).get('likeCount', 'N/A'),
+            'duration': convert_duration(detail.get('contentDetails', {}).get('duration', ''))
+        })
+    return video_data
+
+
+def iter_search_pages(channel_id: str, api_key: str, published_after: Optional[datetime] = None) -> Iterator[List[Dict]]:
+    """search API で1ページずつ (ID, タイトル, 公開日時) のリストを返す（1ページ100ユニット）
 
+    published_after（前回取り込んだ最新の公開日時）を指定した場合はそれより新しい動画だけを返し、
+    取り込み済みの動画に達した時点でページングをやめる。
+    """
+    next_page_token = None
     while True:
-        channel_data = fetch_videos_from_channel(channel_id, api_key, next_page_token)
+        channel_data = fetch_videos_from_channel(channel_id, api_key, next_page_token, published_after)
         if not channel_data:
+            if next_page_token:
+                raise PageFetchError(f"Failed to fetch page {next_page_token} of channel: {channel_id}")
             logger.warning("No data returned for channel ID: %s", channel_id)
-            break
-
-        video_ids = [item['id']['videoId'] for item in channel_data.get('items', [])]
-        details = fetch_video_details(video_ids, api_key)
-
-        for item in channel_data.get('items', []):
-            video_id = item['id']['videoId']
-            video_title = item['snippet']['title']
-            ch_id = item['snippet']['channelId']
-            #ch_title = item['snippet']['channelTitle']
-            #ch_desc = item['snippet']['description']
-            upload_date = item['snippet']['publishedAt']
-            video_url = f"https://www.youtube.com/watch?v={video_id}"
-
-            # 詳細情報を検索
-            detail = next((d for d in details if d['id'] == video_id), {})
-            view_count = detail.get('statistics', {}).get('viewCount', 'N/A')
-            like_count = detail.get('statistics', {}).get('likeCount', 'N/A')
-            duration = convert_duration(detail.get('contentDetails', {}).get('duration', ''))
-
-            video_data.append({
-                'id': video_id,
-                'title': video_title,
-                'upload_date': upload_date,
-                'url': video_url,
-                'view_count': view_count,
-                'like_count': like_count,
-                'duration': duration
-            })
+            return
+
+        entries = [
+            {'id': item['id']['videoId'], 'title': item['snippet']['title'], 'upload_date': item['snippet']['publishedAt']}
+            for item in channel_data.get('items', [])
+        ]
+        # 新しい順に並んでいるので、取り込み済みの動画以降は読まない
+        entries, reached_known = take_until_known(entries, published_after)
+        yield entries
 
         next_page_token = channel_data.get('nextPageToken')
-        if not next_page_token:
-            break
+        if not next_page_token or reached_known:
+            return
 
-        time.sleep(1)  # API制限によりウェイトを追加
 
-    #save_video_data_to_csv(output_file, video_data)
-    logger.info("Video data collection completed for channel: %s", channel_id)
-    return video_data
+def iter_uploads_pages(channel_id: str, api_key: str, published_after: Optional[datetime] = None) -> Iterator[List[Dict]]:
+    """アップロード動画の再生リストを1ページずつたどり (ID, タイトル, 公開日時) のリストを返す（1ページ1ユニット）
+
+    非公開・削除済みの動画は含めない。
+    """
+    playlist_id = fetch_uploads_playlist_id(channel_id, api_key)
+    if not playlist_id:
+        return
+
+    next_page_token = None
+    while True:
+        playlist_data = fetch_playlist_items(playlist_id, api_key, next_page_token)
+        if not playlist_data:
+            if next_page_token:
+                raise PageFetchError(f"Failed to fetch page {next_page_token} of playlist: {playlist_id}")
+            logger.warning("No data returned for playlist: %s", playlist_id)
+            return
+
+        # snippet.publishedAt は再生リストに追加された日時なので動画の公開日時を使う
+        entries = [
+            {'id': item['contentDetails']['videoId'], 'title': item['snippet']['title'],
+             'upload_date': item['contentDetails']['videoPublishedAt']}
+            for item in playlist_data.get('items', [])
+            if item.get('contentDetails', {}).get('videoPublishedAt')
+        ]
+        entries, reached_known = take_until_known(entries, published_after)
+        yield entries
+
+        next_page_token = playlist_data.get('nextPageToken')
+        if not next_page_token or reached_known:
+            return
+
+
+def enrich_pages(pages: Iterable[List[Dict]], api_key: str) -> Iterator[List[Dict]]:
+    """ページごとに videos API で詳細を付けた動画データにする（読み進めた分だけ取得する）"""
+    for entries in pages:
+        if entries:
+            yield build_video_data(entries, api_key)
+
+
+def iter_youtube_video_data(channel_id: str, api_key: str, published_after: Optional[datetime] = None) -> Iterator[List[Dict]]:
+    """search API でたどったチャンネルの動画データを1ページずつ返す"""
+    return enrich_pages(iter_search_pages(channel_id, api_key, published_after), api_key)
+
+
+def iter_uploads_video_data(channel_id: str, api_key: str, published_after: Optional[datetime] = None) -> Iterator[List[Dict]]:
+    """アップロード動画の再生リストでたどったチャンネルの動画データを1ページずつ返す"""
+    return enrich_pages(iter_uploads_pages(channel_id, api_key, published_after), api_key)
+
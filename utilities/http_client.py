@@ -0,0 +1,159 @@
+import os
+import random
+import threading
+import time
+import logging
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utilities.rate_limit import TokenBucket
+from utilities.response_cache import ResponseCache
+
+
+# ロガーの設定
+logging.basicConfig(
+    level=logging.INFO,  # ログレベルを INFO に設定
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # 標準出力にログを表示
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+# API の呼び出しは全スレッド合わせて1秒あたり API_RATE_LIMIT 回まで（API_RATE_BURST 回までは連続で許可）
+rate_limiter = TokenBucket(float(os.getenv('API_RATE_LIMIT', 5)),
+                           float(os.getenv('API_RATE_BURST', 0)) or None)
+
+# 一時的なエラーとみなして再試行するステータスコード
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 5))
+BACKOFF_BASE = float(os.getenv('HTTP_BACKOFF_BASE', 0.5))
+BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', 30))
+TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 30))
+
+# レスポンスのディスクキャッシュ（configure_cache で有効にする）
+# on: ETag を If-None-Match で送り 304 ならディスクから返す / replay: ネットワークを使わずディスクからのみ返す
+CACHE_MODES = ('off', 'on', 'replay')
+response_cache: Optional[ResponseCache] = None
+cache_mode = 'off'
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict[str, float]] = {}
+
+
+class CacheMiss(requests.exceptions.RequestException):
+    """replay モードでキャッシュにないリクエストをしようとした"""
+
+
+def configure_cache(directory: Optional[str], max_bytes: int = 200 * 1024 * 1024, mode: str = 'on'):
+    """レスポンスのディスクキャッシュを設定する（directory が空なら無効）"""
+    global response_cache, cache_mode
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Invalid cache mode: {mode}")
+    if not directory or mode == 'off':
+        response_cache, cache_mode = None, 'off'
+    else:
+        response_cache, cache_mode = ResponseCache(directory, max_bytes), mode
+    logger.info("API response cache: %s (%s)", cache_mode, directory)
+
+
+def get_session() -> requests.Session:
+    """スレッドごとに1つの Session（TLS 接続を keep-alive で使い回す）"""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+        session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+        _local.session = session
+    return session
+
+
+def backoff_seconds(attempt: int, retry_after: Optional[str] = None) -> float:
+    """attempt 回目の再試行までの待ち時間（指数バックオフ＋ジッタ、Retry-After があればそれ以上待つ）"""
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    if retry_after:
+        try:
+            delay = max(delay, min(BACKOFF_MAX, float(retry_after)))
+        except ValueError:
+            pass  # HTTP 日付形式の Retry-After は使わない
+    return delay
+
+
+def _record(endpoint: str, elapsed: float, error: bool = False, retry: bool = False, not_modified: bool = False):
+    with _stats_lock:
+        stats = _stats.setdefault(endpoint, {
+            "requests": 0, "errors": 0, "retries": 0, "not_modified": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+        })
+        stats["requests"] += 1
+        stats["not_modified"] += int(not_modified)
+        stats["errors"] += int(error)
+        stats["retries"] += int(retry)
+        stats["total_seconds"] += elapsed
+        stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+
+def stats() -> Dict[str, Dict[str, float]]:
+    """エンドポイントごとのリクエスト数・エラー数・再試行数・応答時間"""
+    with _stats_lock:
+        return {
+            endpoint: dict(values,
+                           total_seconds=round(values["total_seconds"], 6),
+                           max_seconds=round(values["max_seconds"], 6),
+                           avg_seconds=round(values["total_seconds"] / values["requests"], 6) if values["requests"] else 0.0)
+            for endpoint, values in _stats.items()
+        }
+
+
+def get_json(url: str, endpoint: str = "api", params: Optional[Dict] = None) -> Dict:
+    """レート制限を守って GET し、JSON を返す
+
+    429・5xx・接続エラーは MAX_RETRIES 回までジッタ付きの指数バックオフで再試行する。
+    それでも失敗した場合や 4xx の場合は requests.exceptions.RequestException を送出する。
+    キャッシュが有効な場合は保存済みの ETag を送り、304 ならディスクの内容を返す。
+    """
+    cache = response_cache
+    entry = cache.get(url, params) if cache is not None else None
+    if cache_mode == 'replay':
+        if entry is None:
+            raise CacheMiss(f"No cached response for {endpoint} request")
+        return entry["body"]
+    headers = {"If-None-Match": entry["etag"]} if entry and entry.get("etag") else None
+
+    for attempt in range(MAX_RETRIES + 1):
+        rate_limiter.acquire()
+        start = time.monotonic()
+        try:
+            response = get_session().get(url, params=params, headers=headers, timeout=TIMEOUT)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            retry = attempt < MAX_RETRIES
+            _record(endpoint, time.monotonic() - start, error=True, retry=retry)
+            if not retry:
+                raise
+            delay = backoff_seconds(attempt)
+            logger.warning("%s request failed (%s), retrying in %.1fs", endpoint, e, delay)
+            time.sleep(delay)
+            continue
+
+        elapsed = time.monotonic() - start
+        if response.status_code == 304 and entry is not None:
+            _record(endpoint, elapsed, not_modified=True)
+            return entry["body"]  # 変更がなければ本文を受け取らずディスクの内容を使う
+
+        if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+            _record(endpoint, elapsed, error=True, retry=True)
+            delay = backoff_seconds(attempt, response.headers.get("Retry-After"))
+            logger.warning("%s returned %s, retrying in %.1fs", endpoint, response.status_code, delay)
+            time.sleep(delay)
+            continue
+
+        _record(endpoint, elapsed, error=not response.ok)
+        response.raise_for_status()
+        body = response.json()
+        etag = response.headers.get("ETag")
+        if cache is not None and etag:
+            cache.put(url, etag, body, params)
+        return body
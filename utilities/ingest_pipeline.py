@@ -0,0 +1,144 @@
+import queue
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from utilities.get_videos import latest_upload_date
+from utilities.update_category_db import update_category
+
+
+# ロガーの設定
+logging.basicConfig(
+    level=logging.INFO,  # ログレベルを INFO に設定
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # 標準出力にログを表示
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+class StreamEnd(NamedTuple):
+    """stream_concurrently で1つのタスクが最後まで流れ終わったことを表す（失敗した場合は error）"""
+    error: Optional[BaseException] = None
+
+
+class StreamCancelled(Exception):
+    """呼び出し側の指示でタスクの取得を途中でやめた"""
+
+
+def rechunk(pages: Iterable[Sequence], size: int) -> Iterator[List]:
+    """ページ単位の動画データを書き込み単位（size 件ずつ）にまとめ直す（保持するのは1チャンク分だけ）"""
+    chunk: List = []
+    for page in pages:
+        iterator = iter(page)
+        while True:
+            chunk.extend(islice(iterator, size - len(chunk)))
+            if len(chunk) < size:
+                break
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def classify(chunks: Iterable[List[Dict]]) -> Iterator[Tuple[List[Dict], List[Dict]]]:
+    """動画データのチャンクごとにタイトルからカテゴリ・人数・レベルを判定し、(動画データ, カテゴリデータ) を返す"""
+    for video_data in chunks:
+        yield video_data, update_category([[data['id'], data['title']] for data in video_data])
+
+
+def stream_concurrently(tasks: Iterable[Tuple[Any, tuple]], produce: Callable[..., Iterable],
+                        max_workers: int = 4, queue_size: int = 8,
+                        cancelled: Optional[Set] = None) -> Iterator[Tuple[Any, Any]]:
+    """tasks の (キー, produce の引数) ごとに produce のジェネレータをスレッドプールで並列に読み進め、
+    出てきた順に (キー, 値) を返す。タスクが終わるたびに (キー, StreamEnd) を返す。
+
+    値は大きさ queue_size のキューを通して渡すので、呼び出し側（1スレッドの書き込み）が遅い場合は
+    取得側が待つ（保持するのは最大 queue_size + スレッド数のチャンク分）。
+    cancelled に追加されたキーはそれ以上読み進めず、StreamEnd(StreamCancelled) で終える。
+    """
+    tasks = list(tasks)
+    cancelled = set() if cancelled is None else cancelled
+    results: "queue.Queue[Tuple[Any, Any]]" = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(key, value) -> bool:
+        # 呼び出し側が途中でやめた場合に待ち続けないよう、定期的に stop を確認する
+        while not stop.is_set():
+            if key in cancelled and not isinstance(value, StreamEnd):
+                return False
+            try:
+                results.put((key, value), timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(key, args):
+        if stop.is_set():
+            return
+        try:
+            for value in produce(*args):
+                # 取りやめたキーは次のページを取得しない（API の呼び出しを無駄にしない）
+                if not put(key, value) or key in cancelled:
+                    break
+            else:
+                put(key, StreamEnd())
+                return
+        except Exception as e:
+            logger.error("Failed to fetch %s: %s", key, e)
+            put(key, StreamEnd(e))
+            return
+        if key in cancelled:
+            logger.info("Stopped fetching %s", key)
+            put(key, StreamEnd(StreamCancelled(key)))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest") as executor:
+        for key, args in tasks:
+            executor.submit(run, key, args)
+        try:
+            remaining = len(tasks)
+            while remaining:
+                key, value = results.get()
+                if isinstance(value, StreamEnd):
+                    remaining -= 1
+                yield key, value
+        finally:
+            stop.set()
+
+
+def write_streams(events: Iterable[Tuple[Any, Any]], write: Callable[[Any, List[Dict], List[Dict]], bool],
+                  watermarks: Dict[Any, Any], update_watermark: Callable[[Any, Any], None],
+                  cancel: Optional[Callable[[Any], None]] = None) -> Set:
+    """stream_concurrently の (キー, (動画データ, カテゴリデータ)) を呼び出し元のスレッドで書き込む
+
+    write(キー, 動画データ, カテゴリデータ) が False を返したキーは以降のチャンクを書き込まず、
+    cancel(キー) で取得もやめさせる。
+    最後まで取得・書き込みできたキーだけ、書き込んだ動画の最新の公開日時で update_watermark を呼ぶ
+    （途中で失敗した場合は次回も同じ範囲から取得する）。失敗したキーの集合を返す。
+    """
+    latest = dict(watermarks)
+    failed: Set = set()
+    for key, item in events:
+        if isinstance(item, StreamEnd):
+            if item.error is not None:
+                failed.add(key)
+            elif key not in failed:
+                update_watermark(key, latest[key])
+            continue
+        if key in failed:
+            continue
+
+        video_data, contents_data = item
+        if not write(key, video_data, contents_data):
+            failed.add(key)
+            if cancel is not None:
+                cancel(key)
+            continue
+        chunk_latest = latest_upload_date(video_data)
+        if chunk_latest is not None and (latest[key] is None or chunk_latest > latest[key]):
+            latest[key] = chunk_latest
+    return failed
@@ -0,0 +1,62 @@
+import logging
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+# ロガーの設定
+logging.basicConfig(
+    level=logging.INFO,  # ログレベルを INFO に設定
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # 標準出力にログを表示
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# 新しさの重みが半分になるまでの日数
+RECENCY_HALF_LIFE_DAYS = 180
+# いいね数の重み（再生回数よりも評価の指標として強く扱う）
+LIKE_WEIGHT = 2.0
+# 再計算でこれ以上スコアが変わった動画だけ書き換える（古い動画の新しさの重みは1日ではほとんど変わらない）
+POPULARITY_EPSILON = 0.01
+
+
+def compute_popularity(view_counts: Sequence, like_counts: Sequence, published_at: Sequence,
+                       now: Optional[datetime] = None) -> List[float]:
+    """再生回数・いいね数・新しさから人気スコアをまとめて計算する（sort=popular 用）
+
+    スコア = (log10(1 + 再生回数) + 2 * log10(1 + いいね数)) * (0.5 + 0.5 * 新しさ)
+    新しさは公開からの日数で半減する重み（日付が不明な場合は 0）。
+    """
+    if len(view_counts) == 0:
+        return []
+    now = pd.Timestamp(now or datetime.now(timezone.utc))
+
+    df = pd.DataFrame({
+        "view_count": pd.to_numeric(pd.Series(view_counts, dtype="object"), errors="coerce"),
+        "like_count": pd.to_numeric(pd.Series(like_counts, dtype="object"), errors="coerce"),
+        "published_at": pd.to_datetime(pd.Series(published_at, dtype="object"), utc=True, errors="coerce"),
+    })
+
+    views = df["view_count"].fillna(0).clip(lower=0)
+    likes = df["like_count"].fillna(0).clip(lower=0)
+    engagement = np.log10(1 + views) + LIKE_WEIGHT * np.log10(1 + likes)
+
+    age_days = ((now - df["published_at"]).dt.total_seconds() / 86400).clip(lower=0)
+    recency = np.power(0.5, age_days / RECENCY_HALF_LIFE_DAYS).fillna(0)
+
+    scores = (engagement * (0.5 + 0.5 * recency)).round(6)
+    return scores.astype(float).tolist()
+
+
+# compute_popularity と同じ式を SQL で書いたもの（%(now)s に現在日時を渡す。カラムは contents のもの）
+# 式を変える場合は両方を変える（tests/test_popularity.py で同じ結果になることを確認している）
+POPULARITY_SQL = f"""
+    round(((log(1 + GREATEST(COALESCE(view_count, 0), 0))
+            + {LIKE_WEIGHT} * log(1 + GREATEST(COALESCE(like_count, 0), 0)))
+           * (0.5 + 0.5 * COALESCE(power(0.5, GREATEST(extract(epoch FROM %(now)s - published_at) / 86400, 0)
+                                          / {RECENCY_HALF_LIFE_DAYS}), 0)))::numeric, 6)::double precision
+"""
@@ -0,0 +1,125 @@
+import re
+import hashlib
+import threading
+import weakref
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
+
+import psycopg2
+import psycopg2.errors
+
+
+# ロガーの設定
+logging.basicConfig(
+    level=logging.INFO,  # ログレベルを INFO に設定
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # 標準出力にログを表示
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+PLACEHOLDER = re.compile(r"%%|%s")
+
+
+def to_positional(query: str) -> str:
+    """psycopg2 の %s プレースホルダを PREPARE 用の $1, $2, ... に変換"""
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        if match.group() == "%%":
+            return "%"
+        count += 1
+        return f"${count}"
+
+    return PLACEHOLDER.sub(replace, query)
+
+
+def statement_name(prefix: str, query: str) -> str:
+    """クエリの文字列から決まるステートメント名（どの接続・ワーカーでも同じ名前になる）"""
+    return f"{prefix}_{hashlib.sha1(query.encode('utf-8')).hexdigest()[:16]}"
+
+
+class PreparedStatements:
+    """クエリの形ごとにサーバ側のプリペアドステートメントを作り、接続ごとに再利用する
+
+    検索のクエリは search_shape ごとに決まった文字列になるので、初めて使う接続で一度だけ
+    PREPARE し、以降は EXECUTE で解析・プランニングを省く。接続ごとに max_per_connection を
+    超えたら一番古いものを DEALLOCATE する。
+    """
+
+    def __init__(self, prefix: str = "search", max_per_connection: int = 128):
+        self.prefix = prefix
+        self.max_per_connection = max_per_connection
+        self._lock = threading.Lock()
+        # 接続 → {クエリの文字列: ステートメント名}（プールから捨てられた接続は自動で消える）
+        self._prepared = weakref.WeakKeyDictionary()
+        self.prepares = 0
+        self.executes = 0
+        self.deallocations = 0
+
+    def _statements(self, conn) -> "OrderedDict[str, str]":
+        with self._lock:
+            statements = self._prepared.get(conn)
+            if statements is None:
+                statements = self._prepared[conn] = OrderedDict()
+            return statements
+
+    def forget(self, conn):
+        """接続の PREPARE 済みの記録を消す（サーバ側で消えた場合など）"""
+        with self._lock:
+            self._prepared.pop(conn, None)
+
+    def _prepare(self, cursor, statements: "OrderedDict[str, str]", query: str) -> str:
+        name = statements.get(query)
+        if name is not None:
+            statements.move_to_end(query)
+            return name
+
+        name = statement_name(self.prefix, query)
+        cursor.execute(f"PREPARE {name} AS {to_positional(query)}")
+        statements[query] = name
+        with self._lock:
+            self.prepares += 1
+
+        while len(statements) > self.max_per_connection:
+            _, old_name = statements.popitem(last=False)
+            cursor.execute(f"DEALLOCATE {old_name}")
+            with self._lock:
+                self.deallocations += 1
+        return name
+
+    def execute(self, cursor, query: str, params: Optional[Sequence] = None):
+        """cursor.execute(query, params) の代わりに PREPARE 済みのステートメントを実行する"""
+        params = list(params or [])
+        conn = cursor.connection
+        for attempt in range(2):
+            statements = self._statements(conn)
+            name = self._prepare(cursor, statements, query)
+            placeholders = ", ".join(["%s"] * len(params))
+            try:
+                cursor.execute(f"EXECUTE {name} ({placeholders})" if params else f"EXECUTE {name}", params)
+                break
+            except psycopg2.errors.InvalidSqlStatementName:
+                # DISCARD ALL などでサーバ側から消えていた場合は作り直す（読み取り専用のクエリのみ）
+                logger.warning("Prepared statement %s is missing on the server, preparing again", name)
+                conn.rollback()
+                self.forget(conn)
+                if attempt:
+                    raise
+                cursor.execute("DEALLOCATE ALL")  # 記録とサーバ側の状態を揃える
+        with self._lock:
+            self.executes += 1
+
+    def stats(self) -> Dict[str, int]:
+        """PREPARE・EXECUTE の回数と PREPARE 済みの接続数"""
+        with self._lock:
+            return {
+                "prepares": self.prepares,
+                "executes": self.executes,
+                "deallocations": self.deallocations,
+                "connections": len(self._prepared),
+            }
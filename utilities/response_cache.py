@@ -0,0 +1,115 @@
+import os
+import json
+import hashlib
+import threading
+import logging
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+# ロガーの設定
+logging.basicConfig(
+    level=logging.INFO,  # ログレベルを INFO に設定
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # 標準出力にログを表示
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+# キャッシュのキーに含めないクエリパラメータ（API キーが変わっても同じレスポンスを使い、ディスクにも残さない）
+SECRET_PARAMS = frozenset({"key"})
+
+
+def cache_key(url: str, params: Optional[Dict] = None) -> str:
+    """API キーを除き、パラメータを並べ替えた URL（同じリクエストは同じキーになる）"""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True) + list((params or {}).items())
+    query = sorted((name, str(value)) for name, value in query if name not in SECRET_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+class ResponseCache:
+    """API のレスポンスと ETag をディスクに保存するキャッシュ（合計 max_bytes を超えたら古い順に削除）
+
+    1リクエストにつき1ファイル（キーの SHA-1 をファイル名にした JSON）で、最終更新日時を
+    最後に使った日時として LRU で削除する。
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None  # 初めて書き込むときにディレクトリを走査して求める
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, url: str, params: Optional[Dict] = None) -> Optional[Dict]:
+        """保存済みの {"url", "etag", "body"} を返す（なければ None）"""
+        path = self._path(cache_key(url, params))
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Discarding unreadable cache entry %s: %s", path, e)
+            self._remove(path)
+            return None
+        self.touch(url, params)
+        return entry
+
+    def touch(self, url: str, params: Optional[Dict] = None):
+        """最後に使った日時を更新する（LRU の順番）"""
+        try:
+            os.utime(self._path(cache_key(url, params)))
+        except OSError:
+            pass
+
+    def put(self, url: str, etag: Optional[str], body: Dict, params: Optional[Dict] = None):
+        """レスポンスを保存し、容量を超えた分を古い順に削除する"""
+        key = cache_key(url, params)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"url": key, "etag": etag, "body": body}, f, ensure_ascii=False)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)  # 書き込み途中のファイルを読まないように置き換える
+
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += os.path.getsize(path) - old_size
+            over = self._total_bytes is None or self._total_bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """合計サイズが max_bytes 以下になるまで最後に使った日時が古いものから削除する"""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+            self._total_bytes = total
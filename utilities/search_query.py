@@ -0,0 +1,321 @@
+import base64
+import json
+import logging
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utilities.content_fields import JST
+
+
+# ロガーの設定
+logging.basicConfig(
+    level=logging.INFO,  # ログレベルを INFO に設定
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # 標準出力にログを表示
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+# convert_activities が期待する順番で contents のカラムを並べる
+# （チャンネル名は行ごとに引かず cid から一緒に取得する。日付・埋め込みURLは書き込み時に変換済み。
+#   最後の published_at は表示せず、カーソル作成などの並び替えの値として使う）
+SELECT_COLUMNS: Tuple[str, ...] = (
+    "c.ID", "c.title", "c.upload_date_display", "c.embed_url", "c.view_count",
+    "c.like_count", "c.duration", "ch.cname", "c.published_at", "c.popularity",
+)
+
+# 使用できる並び替えキーと contents のカラム（これ以外は受け付けない）
+# それぞれ (sort_expression DESC, ID DESC) のインデックスを create_sort_indexes で作成する
+SORT_KEYS: Dict[str, str] = {
+    'upload_date': 'published_at',  # 文字列ではなく timestamptz で並べる
+    'view_count': 'view_count',
+    'like_count': 'like_count',
+    'popular': 'popularity',
+}
+
+# NULL になりうる並び替えのカラムで NULL の代わりに使う値（DESC で最後になる値。件数は 0 以上）
+# NULL を先頭に並べず、カーソルの行比較も NULL にならないように COALESCE した式で並べる（popularity は NOT NULL）
+SORT_NULL_VALUES: Dict[str, str] = {
+    'published_at': "'-infinity'::timestamptz",
+    'view_count': '-1',
+    'like_count': '-1',
+}
+
+# contents と category を ID で結合し、フィルタ・並び替え・件数計算をすべてDB側で行う
+FROM_CLAUSE = '''
+    FROM contents c
+    JOIN category cat ON cat.ID = c.ID
+    LEFT JOIN cid ch ON ch.id = c.channel_category
+'''
+
+# 総件数の取得方法: exact は window 関数で正確に数え、estimate は条件なしの
+# 検索に限りプランナの統計情報 (pg_class.reltuples) を使う。
+# exact・estimate の window 関数は LIMIT の前に一致する全行を読むので、separate では
+# ページのクエリに総件数を含めず（並び替えのインデックスから上位N件だけ読む）、build_count_query で別に数える
+TOTAL_MODES = ('exact', 'estimate', 'separate')
+
+ESTIMATED_TOTAL = "(SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = 'category'::regclass)"
+
+# フィルタ名と対応するカラム
+FILTER_COLUMNS: Dict[str, str] = {
+    'type_filter': 'cat.category_title',
+    'players_filter': 'cat.players',
+    'level_filter': 'cat.level',
+    'channel_filter': 'cat.channel_brand_category',
+}
+
+
+def build_query_with_filters(base_query: str, filters: Dict, params: List) -> Tuple[str, List]:
+    """フィルタに基づいてクエリを構築する補助関数"""
+    for name, column in FILTER_COLUMNS.items():
+        if filters.get(name):
+            base_query += f" AND {column} = %s"
+            params.append(filters[name])
+
+    for name, condition in RANGE_FILTERS.items():
+        if filters.get(name) is not None:
+            base_query += f" AND {condition}"
+            params.append(filters[name])
+
+    return base_query, params
+
+# 絞り込み件数（ファセット）のキーとフィルタ名の対応
+FACET_KEYS: Dict[str, str] = {
+    'type_filter': 'category_title',
+    'players_filter': 'players',
+    'level_filter': 'level',
+    'channel_filter': 'channel',
+}
+
+# 範囲フィルタ（動画時間は秒、アップロード日は日時）と条件式（B-tree インデックスで範囲検索できる形）
+RANGE_FILTERS: Dict[str, str] = {
+    'min_duration': 'c.duration_seconds >= %s',
+    'max_duration': 'c.duration_seconds <= %s',
+    'uploaded_after': 'c.published_at >= %s',
+    'uploaded_before': 'c.published_at < %s',
+}
+
+
+def parse_range_filters(args: Dict[str, str]) -> Dict:
+    """リクエストの範囲フィルタを型変換する（不正な値の場合は ValueError）
+
+    日付にタイムゾーンがない場合は日本時間とみなす。
+    """
+    filters = {}
+    for name in ('min_duration', 'max_duration'):
+        value = (args.get(name) or '').strip()
+        if value:
+            seconds = int(value)
+            if seconds < 0:
+                raise ValueError(f"Invalid {name}: {value}")
+            filters[name] = seconds
+    for name in ('uploaded_after', 'uploaded_before'):
+        value = (args.get(name) or '').strip()
+        if value:
+            dt = datetime.fromisoformat(value)
+            filters[name] = dt if dt.tzinfo else dt.replace(tzinfo=JST)
+    return filters
+
+
+def has_range_filters(filters: Dict) -> bool:
+    """範囲フィルタが指定されているか"""
+    return any(filters.get(name) is not None for name in RANGE_FILTERS)
+
+
+def sort_column(sort: str) -> str:
+    """並び替えキーを ORDER BY に使うカラムに変換（登録されていないキーは ValueError）"""
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Invalid sort key: {sort}")
+    return f"c.{SORT_KEYS[sort]}"
+
+
+def sort_expression(sort: str, alias: str = "c.") -> str:
+    """ORDER BY・カーソルの条件・インデックスに使う式（NULL は最後に並ぶ）"""
+    sort_column(sort)
+    column = SORT_KEYS[sort]
+    if column not in SORT_NULL_VALUES:
+        return f"{alias}{column}"
+    return f"COALESCE({alias}{column}, {SORT_NULL_VALUES[column]})"
+
+
+def search_shape(q: str, filters: Dict, ids: Optional[Iterable[str]] = None) -> Tuple:
+    """WHERE 句の形（指定されたフィルタ・範囲フィルタと検索ワードの種類）
+
+    クエリの文字列は形だけで決まるので、形ごとに作成した文字列を使い回す。
+    """
+    return (
+        tuple(name for name in FILTER_COLUMNS if filters.get(name)),
+        tuple(name for name in RANGE_FILTERS if filters.get(name) is not None),
+        'ids' if ids is not None else 'ilike' if q else None,
+    )
+
+
+@lru_cache(maxsize=None)
+def where_clause_text(shape: Tuple) -> str:
+    """search_shape の形から WHERE 句を作成"""
+    filter_names, range_names, match = shape
+    where = " WHERE 1=1"
+    where += "".join(f" AND {FILTER_COLUMNS[name]} = %s" for name in filter_names)
+    where += "".join(f" AND {RANGE_FILTERS[name]}" for name in range_names)
+    if match == 'ids':
+        where += " AND c.ID = ANY(%s)"
+    elif match == 'ilike':
+        where += " AND c.title ILIKE %s"
+    return where
+
+
+def where_params(q: str, filters: Dict, ids: Optional[Iterable[str]], shape: Tuple) -> List:
+    """where_clause_text の %s の順に並べたパラメータ"""
+    filter_names, range_names, match = shape
+    params = [filters[name] for name in filter_names + range_names]
+    if match == 'ids':
+        params.append(list(ids))
+    elif match == 'ilike':
+        params.append(f"%{q}%")
+    return params
+
+
+def build_where_clause(q: str, filters: Dict, ids: Optional[Iterable[str]] = None) -> Tuple[str, List]:
+    """検索ワードとフィルタから WHERE 句とパラメータを作成
+
+    ids（タイトル検索インデックスで絞り込んだ候補）を指定した場合は ILIKE の代わりに使う。
+    """
+    shape = search_shape(q, filters, ids)
+    return where_clause_text(shape), where_params(q, filters, ids, shape)
+
+
+# search_query_text の総件数のカラム（None は総件数を含めない）
+TOTAL_COLUMNS: Dict[Optional[str], str] = {
+    'window': ", count(*) OVER () AS total",
+    'estimate': f", {ESTIMATED_TOTAL} AS total",
+    None: "",
+}
+
+
+@lru_cache(maxsize=None)
+def search_query_text(shape: Tuple, sort: str, total: Optional[str], has_cursor: bool) -> str:
+    """build_search_query のクエリの文字列（形・並び替えキー・総件数のカラム・カーソルの有無で決まる）"""
+    column = sort_expression(sort)
+    where = where_clause_text(shape)
+    if has_cursor:
+        where += f" AND ({column}, c.ID) < (%s, %s)"
+    query = f"SELECT {', '.join(SELECT_COLUMNS)}{TOTAL_COLUMNS[total]}" + FROM_CLAUSE + where
+    query += f" ORDER BY {column} DESC, c.ID DESC LIMIT %s OFFSET %s"
+    return query
+
+
+def build_search_query(q: str, filters: Dict, sort: str, limit: int, offset: int,
+                       total_mode: str = 'exact', cursor: Optional[Tuple] = None,
+                       ids: Optional[Iterable[str]] = None) -> Tuple[str, List]:
+    """1ページ分の動画と総件数（各行の最後のカラム）を1つのクエリで取得する
+
+    cursor（decode_cursor の戻り値）を指定した場合は OFFSET の代わりに前ページ最後の
+    (並び替えの値, ID) より後ろの行から読み始める。このとき総件数はカーソル以降の件数になる。
+    total_mode が separate の場合は総件数のカラムを含めない。
+    """
+    if total_mode not in TOTAL_MODES:
+        raise ValueError(f"Invalid total mode: {total_mode}")
+    sort_column(sort)
+
+    shape = search_shape(q, filters, ids)
+    params = where_params(q, filters, ids, shape)
+    if total_mode == 'separate':
+        total = None
+    elif total_mode == 'estimate' and not params and cursor is None:
+        total = 'estimate'
+    else:
+        total = 'window'
+    query = search_query_text(shape, sort, total, cursor is not None)
+
+    if cursor is not None:
+        params.extend(cursor)
+        offset = 0
+    params.extend([limit, offset])
+    return query, params
+
+
+def build_count_query(q: str, filters: Dict, ids: Optional[Iterable[str]] = None) -> Tuple[str, List]:
+    """条件に一致する動画の総数を取得するクエリを作成（ページが空の場合・total_mode が separate の場合に使う）"""
+    where, params = build_where_clause(q, filters, ids)
+    return "SELECT count(*)" + FROM_CLAUSE + where, params
+
+
+def build_index_rows_query() -> str:
+    """プロセス内のファセットインデックス用に全動画の行とフィルタの値を取得するクエリ"""
+    columns = list(SELECT_COLUMNS) + list(FILTER_COLUMNS.values())
+    return f"SELECT {', '.join(columns)}" + FROM_CLAUSE
+
+
+def build_facet_counts_query(q: str, filters: Dict, ids: Optional[Iterable[str]] = None) -> Tuple[str, List]:
+    """フィルタの値ごとの一致件数を1つのクエリで数える
+
+    各フィルタの件数は、そのフィルタ自身を除いた条件で数える（選択を変えた場合の件数になる）。
+    """
+    parts, params = [], []
+    for name, column in FILTER_COLUMNS.items():
+        other_filters = {key: value for key, value in filters.items() if key != name}
+        where, where_params = build_where_clause(q, other_filters, ids)
+        parts.append(
+            f"SELECT '{FACET_KEYS[name]}' AS facet, {column}::text AS value, count(*)"
+            + FROM_CLAUSE + where + f" GROUP BY {column}"
+        )
+        params.extend(where_params)
+    return " UNION ALL ".join(parts), params
+
+
+def collect_facet_counts(rows: Iterable[Tuple[str, Optional[str], int]]) -> Dict[str, Dict[str, int]]:
+    """build_facet_counts_query の結果をフィルタごとの {値: 件数} にまとめる"""
+    counts: Dict[str, Dict[str, int]] = {key: {} for key in FACET_KEYS.values()}
+    for facet, value, count in rows:
+        if value is not None:
+            counts[facet][value] = count
+    return counts
+
+
+def split_total(rows: List[Tuple]) -> Tuple[List[Tuple], Optional[int]]:
+    """build_search_query の結果を動画の行と総件数に分ける（行がない場合の総件数は None）"""
+    if not rows:
+        return [], None
+    return [row[:-1] for row in rows], rows[0][-1]
+
+
+def encode_cursor(sort: str, value, video_id: str) -> str:
+    """並び替えキー・最後の行の値・IDから不透明なカーソル文字列を作成"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort, value, video_id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple:
+    """カーソル文字列を (並び替えの値, ID) に戻す。不正な場合は ValueError"""
+    try:
+        cursor_sort, value, video_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if cursor_sort != sort or value is None or not isinstance(video_id, str):
+        raise ValueError(f"Cursor does not match sort key: {sort}")
+    if sort_column(sort) == 'c.published_at':
+        if not isinstance(value, str):
+            raise ValueError(f"Invalid cursor value: {value!r}")
+        value = datetime.fromisoformat(value)  # 不正な値の場合は ValueError
+        if value.tzinfo is None:  # timestamptz と比較できないのでタイムゾーン付きのみ受け付ける
+            raise ValueError(f"Invalid cursor value: {value!r}")
+    elif isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"Invalid cursor value: {value!r}")
+    return value, video_id
+
+
+def next_cursor(rows: List[Tuple], sort: str, limit: int) -> Optional[str]:
+    """ページの最後の行から次ページ用のカーソルを作成（最終ページ・値が NULL の場合は None）"""
+    if not rows or len(rows) < limit:
+        return None
+    column = sort_column(sort)
+    last = rows[-1]
+    value = last[SELECT_COLUMNS.index(column)]
+    if value is None:  # NULL はタプル比較できないので OFFSET でのページングに任せる
+        return None
+    return encode_cursor(sort, value, last[0])
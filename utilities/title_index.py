@@ -0,0 +1,80 @@
+import threading
+import unicodedata
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, Set, Tuple
+
+
+# ロガーの設定
+logging.basicConfig(
+    level=logging.INFO,  # ログレベルを INFO に設定
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler()  # 標準出力にログを表示
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def normalize_title(text: str) -> str:
+    """NFKC 正規化と大文字小文字の統一（ILIKE と同じく大文字小文字を区別しない）"""
+    return unicodedata.normalize("NFKC", text or "").casefold()
+
+
+def title_grams(text: str) -> Set[str]:
+    """正規化済みの文字列から1文字・2文字のグラムを作成"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+class TitleIndex:
+    """タイトルの文字バイグラム転置インデックス（日本語の部分一致検索用）"""
+
+    def __init__(self):
+        self._titles: Dict[str, str] = {}
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[str, str]]) -> "TitleIndex":
+        """(ID, タイトル) の一覧からインデックスを作成"""
+        index = cls()
+        for video_id, title in rows:
+            index.add(video_id, title)
+        logger.info("Title index built with %d titles", len(index))
+        return index
+
+    def add(self, video_id: str, title: str):
+        """動画を1件インデックスに追加（既存の場合は置き換え）"""
+        normalized = normalize_title(title)
+        with self._lock:
+            old = self._titles.get(video_id)
+            if old is not None:
+                for gram in title_grams(old):
+                    self._postings[gram].discard(video_id)
+            self._titles[video_id] = normalized
+            for gram in title_grams(normalized):
+                self._postings[gram].add(video_id)
+
+    def search(self, q: str) -> Set[str]:
+        """検索ワードを部分一致で含むタイトルの ID 集合を返す"""
+        normalized = normalize_title(q)
+        if not normalized:
+            return set()
+
+        if len(normalized) == 1:
+            grams = [normalized]
+        else:
+            grams = [normalized[i:i + 2] for i in range(len(normalized) - 1)]
+
+        with self._lock:
+            postings = sorted((self._postings.get(gram, set()) for gram in set(grams)), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            if len(normalized) <= 2:
+                return candidates
+            # バイグラムがすべて含まれていても連続しているとは限らないので最後に確認する
+            return {video_id for video_id in candidates if normalized in self._titles[video_id]}
+
+    def __len__(self):
+        return len(self._titles)